@@ -1,9 +1,22 @@
-import ipaddress
+import hashlib
+import hmac
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.contrib.auth import authenticate, get_user_model
+from django.db import close_old_connections
+from django.utils.functional import cached_property
 from rest_framework.authentication import BaseAuthentication
+from rest_framework.authentication import (
+    BasicAuthentication as DefaultBasicAuthentication,
+)
+from rest_framework.authentication import (
+    SessionAuthentication,
+    get_authorization_header,
+)
 from rest_framework_simplejwt.authentication import (
     JWTAuthentication as DefaultJWTAuthentication,
 )
@@ -12,12 +25,18 @@ from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import BlacklistMixin, Token
 
 from backend_service.exceptions import (
+    AuthenticationFailedAPIException,
     InvalidTokenAPIException,
     NotAuthorizedAPIException,
+    ThrottledAPIException,
 )
 from backend_service.logging import thread_local_storage
+from backend_service.revocations import revocation_index
+from utils.cache import MISSING, LocalCache
+from utils.ip_addresses import get_ip_allow_list
 from utils.request_helpers import get_ip_address
 from utils.tokens import decoded_token
+from utils.users import get_cached_user, is_user_active
 
 logger = logging.getLogger("default")
 
@@ -28,41 +47,166 @@ class AccessToken(BlacklistMixin, Token):
     token_type = "access"  # nosec
     lifetime = api_settings.ACCESS_TOKEN_LIFETIME
 
+    def check_blacklist(self):
+        """
+        Only query the blacklist tables when the in-memory revocation index can't rule the token out.
+        """
+        if revocation_index.might_be_revoked(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
 
 class IPAddressAuthentication(BaseAuthentication):
     def authenticate(self, request):
         ip_address = get_ip_address(request)
         logger.info("Request is coming from %s", ip_address)
-        if (
-            "*" in settings.WHITELISTED_IP_ADDRESSES
-            or ip_address in settings.WHITELISTED_IP_ADDRESSES
-            or self._match_cidr(ip_address)
+        if ip_address in get_ip_allow_list(
+            "WHITELISTED_IP_ADDRESSES", "WHITELISTED_CIDR"
         ):
             return None
         raise NotAuthorizedAPIException
 
-    @staticmethod
-    def _match_cidr(ip_address):
-        for cidr in settings.WHITELISTED_CIDR:
-            # create an ipaddress.IPv4Address object from the IP address string
-            ip_address = ipaddress.IPv4Address(ip_address)
 
-            # create an ipaddress.IPv4Network object from the subnet string
-            subnet = ipaddress.IPv4Network(cidr)
+class TokenRole:
+    """
+    Compact, immutable role built once from the `role` of a token's custom claim.
+    The keys of the role are exposed as attributes, e.g. `user.role.name`.
+    """
+
+    __slots__ = ("_attributes",)
+
+    def __init__(self, attributes):
+        object.__setattr__(self, "_attributes", dict(attributes))
+
+    def __getattr__(self, name):
+        if name == "_attributes":
+            raise AttributeError(name)
+        try:
+            return self._attributes[name]
+        except KeyError as exc:
+            raise AttributeError(name) from exc
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._attributes!r})"
+
+
+def get_token_role(validated_token):
+    """
+    Returns the `TokenRole` of a validated token, building it on first use only.
+    """
+    role = getattr(validated_token, "role", None)
+    if role is None:
+        role = validated_token.role = TokenRole(
+            validated_token["custom_claim"]["role"]
+        )
+    return role
 
-            # check if the IP address is within the subnet
-            if ip_address in subnet:
-                return True
 
-        return False
+class ClaimsUser:
+    """
+    Principal built purely from the claims of a validated token, for views which opt in through
+    `claims_user_actions`.
+
+    `uuid`, `organisation_id`, `business_unit` and `role` are read from the token (`organisation_id` and
+    `business_unit` from the custom claim, falling back to top-level claims). Touching any other attribute loads
+    the actual user once, through the user cache, and reads it from there.
+
+    Revoked tokens are rejected when the token is validated, and deactivated or deleted users by
+    `JWTAuthentication.get_claims_user`, through a cached flag.
+    """
+
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        self.token = token
+
+    def __str__(self):
+        return f"ClaimsUser {self.uuid}"
+
+    def __eq__(self, other):
+        return getattr(other, "uuid", None) == self.uuid
+
+    def __hash__(self):
+        return hash(self.uuid)
+
+    def __getattr__(self, name):
+        # Only called for attributes which aren't carried by the token
+        if name.startswith("_") or name == "user":
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    @cached_property
+    def uuid(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    @cached_property
+    def organisation_id(self):
+        return self._get_claim("organisation_id")
+
+    @cached_property
+    def business_unit(self):
+        return self._get_claim("business_unit")
+
+    @cached_property
+    def role(self):
+        return get_token_role(self.token)
+
+    @cached_property
+    def user(self):
+        user = get_cached_user(self.uuid)
+        user.role = self.role
+        return user
+
+    def _get_claim(self, name):
+        return self.token["custom_claim"].get(name, self.token.get(name))
+
+
+# Verified and decoded tokens, keyed by their signature segment, kept until they expire. Clients send the same
+# token hundreds of times, this saves verifying its signature and decoding its custom claim on every request.
+verified_token_cache = LocalCache(maxsize=settings.VERIFIED_TOKEN_CACHE_MAX_SIZE)
 
 
 class JWTAuthentication(DefaultJWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if self.accepts_claims_user(request):
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    @staticmethod
+    def accepts_claims_user(request):
+        """
+        Whether the view handling the request listed the current action in its `claims_user_actions`.
+        """
+        view = (request.parser_context or {}).get("view")
+        return getattr(view, "action", None) in getattr(
+            view, "claims_user_actions", ()
+        )
+
     def get_validated_token(self, raw_token: bytes) -> Token:
+        validated_token = self.get_cached_token(raw_token)
+        if validated_token is not None:
+            return validated_token
+
         for token_class in api_settings.AUTH_TOKEN_CLASSES:
             try:
                 validated_token = token_class(raw_token)
                 validated_token = decoded_token(validated_token)
+                self.cache_token(raw_token, validated_token)
                 return validated_token
             except TokenError as e:
                 logger.debug(
@@ -75,6 +219,38 @@ class JWTAuthentication(DefaultJWTAuthentication):
 
         raise InvalidTokenAPIException
 
+    @staticmethod
+    def get_cached_token(raw_token: bytes):
+        """
+        Returns the already verified token for `raw_token`, or None if it isn't cached.
+        The blacklist is checked on every call, so a revoked token is rejected even if it is cached.
+        """
+        signature = raw_token.rsplit(b".", 1)[-1]
+        entry = verified_token_cache.get(signature)
+        if entry is MISSING:
+            return None
+
+        cached_raw_token, validated_token = entry
+        if not hmac.compare_digest(cached_raw_token, raw_token):
+            return None
+
+        if isinstance(validated_token, BlacklistMixin):
+            try:
+                validated_token.check_blacklist()
+            except TokenError as exc:
+                verified_token_cache.delete(signature)
+                raise InvalidTokenAPIException from exc
+        return validated_token
+
+    @staticmethod
+    def cache_token(raw_token: bytes, validated_token: Token):
+        expires_in = validated_token.get("exp", 0) - time.time()
+        if expires_in > 0:
+            signature = raw_token.rsplit(b".", 1)[-1]
+            verified_token_cache.set(
+                signature, (raw_token, validated_token), timeout=expires_in
+            )
+
     def get_user(self, validated_token):
         user_id = validated_token.get("user_id")
         if (
@@ -87,10 +263,8 @@ class JWTAuthentication(DefaultJWTAuthentication):
             user = None
         else:
             try:
-                user = User.objects.get(uuid=user_id)
-                user.role = type(
-                    "Role", (object,), validated_token["custom_claim"]["role"]
-                )
+                user = get_cached_user(user_id)
+                user.role = get_token_role(validated_token)
             except User.DoesNotExist:
                 logger.error(
                     "Suspicious Authentication Attempt: No user found for user_id: %s",
@@ -102,3 +276,176 @@ class JWTAuthentication(DefaultJWTAuthentication):
                 thread_local_storage.org_id = user.organisation_id
 
         return user
+
+    @staticmethod
+    def get_claims_user(validated_token):
+        """
+        Same as `get_user`, without loading the user; see `ClaimsUser`. Querysets are scoped by the organisation
+        of the token, so a token without one, or without a role, is rejected instead of matching rows of no
+        organisation.
+        """
+        if (
+            api_settings.USER_ID_CLAIM not in validated_token
+            or "custom_claim" not in validated_token
+            or "role" not in validated_token["custom_claim"]
+        ):
+            logger.error(
+                "Suspicious Authentication Attempt: No user id, custom_claim or role found in token"
+            )
+            raise InvalidTokenAPIException
+
+        user = ClaimsUser(validated_token)
+        if not user.organisation_id:
+            logger.error(
+                "Suspicious Authentication Attempt: No organisation_id found in token"
+            )
+            raise InvalidTokenAPIException
+        if not is_user_active(user.uuid):
+            logger.error(
+                "Authentication Attempt of a deactivated or deleted user: %s", user.uuid
+            )
+            raise InvalidTokenAPIException
+
+        thread_local_storage.user_id = user.uuid
+        thread_local_storage.org_id = user.organisation_id
+        return user
+
+
+class PasswordVerifier:
+    """
+    Authenticates username and password credentials on a bounded pool of threads, so that a storm of Basic
+    authentication requests can't tie up every worker thread hashing passwords. Once `max_workers + queue_size`
+    verifications are in flight, further requests are rejected with a 429 instead of waiting.
+
+    Credentials go through `django.contrib.auth.authenticate`, i.e. every backend of `AUTHENTICATION_BACKENDS`
+    (lockouts included), which sends `user_login_failed` on failures and upgrades outdated password hashes.
+
+    Verified credentials are remembered for `settings.BASIC_AUTH_CACHE_TIMEOUT` seconds, keyed by an HMAC of the
+    username and password with the `SECRET_KEY`, so that the cache never holds anything a password can be
+    recovered from. An entry only matches while the stored password hash of the user is unchanged and the user is
+    active.
+    """
+
+    def __init__(self, max_workers, queue_size):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-verifier"
+        )
+        self.slots = threading.BoundedSemaphore(max_workers + queue_size)
+        self.cache = LocalCache(
+            maxsize=settings.BASIC_AUTH_CACHE_MAX_SIZE,
+            timeout=settings.BASIC_AUTH_CACHE_TIMEOUT,
+        )
+
+    def authenticate(self, request, username, password):
+        """
+        Returns the user matching the credentials, or None.
+
+        Raises:
+            ThrottledAPIException: If too many verifications are already in flight.
+        """
+        key = self.get_cache_key(username, password)
+        user = self.get_cached_user(key)
+        if user is not None:
+            return user
+
+        # Can't be a `with`: a full verifier rejects instead of waiting, the slot is released in the `finally`
+        if not self.slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+            logger.warning("Password verification rejected as the verifier is saturated")
+            raise ThrottledAPIException
+        try:
+            user = self.executor.submit(
+                self._authenticate, request, username, password
+            ).result()
+        finally:
+            self.slots.release()
+
+        if user is not None:
+            self.cache.set(key, (user.pk, user.password))
+        return user
+
+    def get_cached_user(self, key):
+        entry = self.cache.get(key, None)
+        if entry is None:
+            return None
+        pk, password = entry
+        user = User.objects.filter(pk=pk).first()
+        if user is None or user.password != password or not user.is_active:
+            self.cache.delete(key)
+            return None
+        return user
+
+    @staticmethod
+    def get_cache_key(username, password):
+        return hmac.new(
+            settings.SECRET_KEY.encode(),
+            f"{username}\0{password}".encode(),
+            hashlib.sha256,
+        ).digest()
+
+    @staticmethod
+    def _authenticate(request, username, password):
+        # Django opens a database connection per thread, recycle the ones of the pool like a request would
+        close_old_connections()
+        try:
+            return authenticate(request=request, username=username, password=password)
+        finally:
+            close_old_connections()
+
+
+password_verifier = PasswordVerifier(
+    max_workers=settings.PASSWORD_VERIFICATION_WORKERS,
+    queue_size=settings.PASSWORD_VERIFICATION_QUEUE_SIZE,
+)
+
+
+class BasicAuthentication(DefaultBasicAuthentication):
+    """
+    Basic authentication running the authentication backends through `password_verifier` instead of on the
+    request thread.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        user = password_verifier.authenticate(request, userid, password)
+        if user is None or not user.is_active:
+            raise AuthenticationFailedAPIException
+        return user, None
+
+
+class SchemeDispatchAuthentication(BaseAuthentication):
+    """
+    Picks the single authentication class able to handle a request, instead of trying them one after the other:
+    Basic or JWT from the scheme of the `Authorization` header, and session authentication when there is a session
+    cookie and no `Authorization` header with one of these schemes.
+    """
+
+    basic_authentication_class = BasicAuthentication
+    jwt_authentication_class = JWTAuthentication
+    session_authentication_class = SessionAuthentication
+
+    @cached_property
+    def authenticators_by_scheme(self):
+        authenticators = {b"basic": self.basic_authentication_class()}
+        jwt_authentication = self.jwt_authentication_class()
+        for header_type in api_settings.AUTH_HEADER_TYPES:
+            authenticators[header_type.lower().encode()] = jwt_authentication
+        return authenticators
+
+    def get_authenticator(self, request):
+        header = get_authorization_header(request)
+        if header:
+            scheme = header.split(b" ", 1)[0].lower()
+            authenticator = self.authenticators_by_scheme.get(scheme)
+            if authenticator is not None:
+                return authenticator
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return self.session_authentication_class()
+        return None
+
+    def authenticate(self, request):
+        authenticator = self.get_authenticator(request)
+        if authenticator is None:
+            return None
+        return authenticator.authenticate(request)
+
+    def authenticate_header(self, request):
+        return self.authenticators_by_scheme[b"basic"].authenticate_header(request)
@@ -0,0 +1,252 @@
+import os
+import pickle  # nosec B403: only unpickles the values this worker cached
+import socket
+from collections import Counter
+from functools import lru_cache
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+from utils.cache import MISSING, LocalCache
+from utils.redis_client import RedisSubscriber, publish
+
+# Types stored as they are in the in-process tier; anything else is pickled, so that callers can't modify it
+IMMUTABLE_TYPES = (int, float, bool, str, bytes, type(None))
+# Message clearing the whole in-process tier
+CLEAR_ALL = "*"
+
+
+class LocalTier:
+    """
+    In-process tier of `TwoTierRedisCache`, shared by the threads of a worker, and kept current through Redis
+    pub/sub: every write of a key publishes it on `channel`, and the other workers drop their copy.
+    """
+
+    def __init__(self, channel, maxsize, timeout, max_value_size):
+        self.channel = channel
+        self.max_value_size = max_value_size
+        self.cache = LocalCache(maxsize=maxsize, timeout=timeout)
+        self.redis_counters = Counter()
+        # Bumped by every invalidation, see `fill`
+        self.epoch = 0
+        self.subscriber = RedisSubscriber(
+            channel,
+            on_message=self.on_message,
+            # Messages published while disconnected are lost, start afresh
+            on_connect=self.clear,
+        )
+
+    @property
+    def sender(self):
+        # Identifies this worker in its messages, so that it doesn't drop what it has just written
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether the tier can be used: only while subscribed, otherwise invalidations would be missed.
+        """
+        self.subscriber.ensure_started()
+        return self.subscriber.connected
+
+    def get(self, key):
+        if not self.enabled:
+            return MISSING
+        entry = self.cache.get(key)
+        if entry is MISSING:
+            return MISSING
+        is_pickled, value = entry
+        return pickle.loads(value) if is_pickled else value  # nosec B301: pickled by this worker
+
+    def fill(self, key, value, epoch):
+        """
+        Stores a value read from Redis, unless something was invalidated since the read started: the value may
+        predate the write which was invalidated, and would then be kept here after it.
+        """
+        if epoch != self.epoch or not self.enabled:
+            return
+        is_pickled = not isinstance(value, IMMUTABLE_TYPES)
+        if is_pickled:
+            value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if isinstance(value, (str, bytes)) and len(value) > self.max_value_size:
+            self.cache.delete(key)
+            return
+        self.cache.set(key, (is_pickled, value))
+
+    def clear(self):
+        self.epoch += 1
+        self.cache.clear()
+
+    def drop(self, keys):
+        self.epoch += 1
+        for key in keys:
+            if key == CLEAR_ALL:
+                self.cache.clear()
+            else:
+                self.cache.delete(key)
+
+    def invalidate(self, *keys):
+        """
+        Drops keys from this worker and tells the other workers to do the same.
+        """
+        if keys:
+            self.drop(keys)
+            publish(self.channel, "\n".join((self.sender, *keys)))
+
+    def on_message(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        sender, *keys = data.split("\n")
+        if sender != self.sender:
+            self.drop(keys)
+
+    def stats(self) -> dict:
+        return {
+            "local": {**self.cache.stats(), "connected": self.subscriber.connected},
+            "redis": {"hits": self.redis_counters["hits"], "misses": self.redis_counters["misses"]},
+        }
+
+
+@lru_cache(maxsize=None)
+def get_local_tier(channel, maxsize, timeout, max_value_size) -> LocalTier:
+    # Django creates a cache backend per thread, the in-process tier is shared by all of them
+    return LocalTier(channel, maxsize, timeout, max_value_size)
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    Django's `RedisCache`, with a bounded in-process LRU in front of it, so that hot, read-mostly keys don't cost
+    a round trip to Redis on every read.
+
+    - Reads are served by the in-process tier when they can, and fill it otherwise.
+    - Writes (`set`, `add`, `incr`, `delete`, `touch`, their `_many` variants and `clear`) go to Redis, and are
+      broadcast on a pub/sub channel so that every worker drops its copy within milliseconds.
+    - Entries are kept in-process for at most `LOCAL_TIMEOUT` seconds. A key filled by a read can outlive its
+      expiry in Redis by that long, which is why the timeout is short.
+    - Only keys starting with one of `LOCAL_KEY_PREFIXES` go through the in-process tier, all the others are
+      read from Redis as with `RedisCache`. Copies are dropped asynchronously, so only list keys whose value
+      never changes, e.g. keyed by a model generation, or which can be stale for a few milliseconds. Counters
+      such as generations, locks and negative markers must always be read from Redis.
+    - Values larger than `LOCAL_MAX_VALUE_SIZE` bytes once pickled, and all keys while the worker isn't
+      subscribed to the channel, are only cached in Redis.
+
+    Configure it in `CACHES`, its own options in `OPTIONS` next to the ones of `RedisCache`:
+    `LOCAL_KEY_PREFIXES`, `LOCAL_MAX_SIZE` (entries), `LOCAL_TIMEOUT` (seconds), `LOCAL_MAX_VALUE_SIZE` (bytes)
+    and `INVALIDATION_CHANNEL`. `stats()` returns the hits and misses of both tiers for the current worker.
+    """
+
+    def __init__(self, server, params):
+        params = {**params, "OPTIONS": dict(params.get("OPTIONS", {}))}
+        options = params["OPTIONS"]
+        channel = options.pop("INVALIDATION_CHANNEL", "cache_invalidations")
+        maxsize = options.pop("LOCAL_MAX_SIZE", 4096)
+        timeout = options.pop("LOCAL_TIMEOUT", 30)
+        max_value_size = options.pop("LOCAL_MAX_VALUE_SIZE", 16 * 1024)
+        self.local_key_prefixes = tuple(options.pop("LOCAL_KEY_PREFIXES", ()))
+        super().__init__(server, params)
+        self.local = get_local_tier(channel, maxsize, timeout, max_value_size)
+
+    def is_local(self, key) -> bool:
+        """
+        Whether a key goes through the in-process tier.
+        """
+        return key.startswith(self.local_key_prefixes)
+
+    def get(self, key, default=None, version=None):
+        if not self.is_local(key):
+            return super().get(key, default, version=version)
+
+        made_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(made_key)
+        if value is not MISSING:
+            return value
+
+        epoch = self.local.epoch
+        value = super().get(key, MISSING, version=version)
+        if value is MISSING:
+            self.local.redis_counters["misses"] += 1
+            return default
+        self.local.redis_counters["hits"] += 1
+        self.local.fill(made_key, value, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            if not self.is_local(key):
+                missing.append(key)
+                continue
+            value = self.local.get(self.make_and_validate_key(key, version=version))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing:
+            epoch = self.local.epoch
+            fetched = super().get_many(missing, version=version)
+            self.local.redis_counters["hits"] += len(fetched)
+            self.local.redis_counters["misses"] += len(missing) - len(fetched)
+            for key, value in fetched.items():
+                if self.is_local(key):
+                    self.local.fill(self.make_and_validate_key(key, version=version), value, epoch)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout=timeout, version=version)
+        self._written(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout=timeout, version=version)
+        if added:
+            self._written(key, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = super().touch(key, timeout=timeout, version=version)
+        # The expiry changed, copies can't tell when they expire anymore
+        self._written(key, version=version)
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta=delta, version=version)
+        self._written(key, version=version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version=version)
+        self._written(key, version=version)
+        return deleted
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout=timeout, version=version)
+        self._written(*data, version=version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        super().delete_many(keys, version=version)
+        self._written(*keys, version=version)
+
+    def clear(self):
+        cleared = super().clear()
+        self.local.invalidate(CLEAR_ALL)
+        return cleared
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of both tiers for the current worker, and the size of the in-process
+        tier.
+        """
+        return self.local.stats()
+
+    def _written(self, *keys, version=None):
+        self.local.invalidate(
+            *(
+                self.make_and_validate_key(key, version=version)
+                for key in keys
+                if self.is_local(key)
+            )
+        )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher as DefaultArgon2PasswordHasher,
+)
+
+
+class Argon2PasswordHasher(DefaultArgon2PasswordHasher):
+    """
+    Argon2 hasher with cost parameters taken from the settings, so that they can be tuned per environment.
+    Passwords hashed with other parameters are still verified, and re-hashed with the current ones on login.
+    """
+
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
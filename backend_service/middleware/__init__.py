@@ -1,2 +1,3 @@
+from backend_service.middleware.compression import CompressionMiddleware
 from backend_service.middleware.health_check import HealthCheckMiddleware
 from backend_service.middleware.logging import LoggingMiddleware
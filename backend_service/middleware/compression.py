@@ -0,0 +1,200 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Types which are compressed already, or not worth it
+INCOMPRESSIBLE_CONTENT_TYPES = (
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/zstd",
+    "application/x-bzip2",
+    "application/x-7z-compressed",
+    "application/pdf",
+    "font/woff",
+    "font/woff2",
+    "image/",
+    "audio/",
+    "video/",
+)
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# Content codings in order of preference, with their compressor and their levels for small and large bodies. Large
+# bodies and streams get the cheaper level, which bounds the CPU spent on a single response.
+CODINGS = [
+    (coding, compressor, levels)
+    for coding, compressor, levels, available in (
+        ("zstd", ZstdCompressor, (6, 3), zstandard is not None),
+        ("br", BrotliCompressor, (5, 3), brotli is not None),
+        ("gzip", GzipCompressor, (6, 4), True),
+    )
+    if available
+]
+
+
+def parse_accept_encoding(header):
+    """
+    Returns the content codings accepted by the client, with their quality, e.g. {"gzip": 1.0, "br": 0.5}.
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses with zstd, brotli or gzip, the first of them which the client accepts.
+
+    - Bodies smaller than `settings.COMPRESSION_MIN_SIZE`, responses which already have a `Content-Encoding`, and
+      types which are compressed already (e.g. the gzipped CSV downloads) are sent as they are.
+    - Streaming responses are compressed chunk by chunk, and every chunk is flushed so that the client gets data
+      as it is produced.
+    - Bodies larger than `settings.COMPRESSION_LARGE_SIZE`, and streams, are compressed with a cheaper level.
+    - Partial responses (206, or with a `Content-Range`) are sent as they are, the range applies to the
+      uncompressed body.
+    - Against BREACH, responses carrying a secret next to content an attacker may control aren't compressed:
+      pages which rendered a CSRF token, and responses setting cookies.
+    """
+
+    def process_response(self, request, response):
+        if not self.is_compressible(response) or self.carries_secrets(request, response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = self.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+        name, compressor_class, (level, large_level) = coding
+
+        if response.streaming:
+            compressor = compressor_class(large_level)
+            if response.is_async:
+                response.streaming_content = self.compress_async_stream(
+                    compressor, response.streaming_content
+                )
+            else:
+                response.streaming_content = self.compress_stream(
+                    compressor, response.streaming_content
+                )
+            del response["Content-Length"]
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            large = len(response.content) > settings.COMPRESSION_LARGE_SIZE
+            compressor = compressor_class(large_level if large else level)
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The representation changed, a strong ETag would no longer match it byte for byte
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        response["Content-Encoding"] = name
+        return response
+
+    @staticmethod
+    def is_compressible(response):
+        if (
+            response.status_code in (204, 206, 304)
+            or response.has_header("Content-Encoding")
+            or response.has_header("Content-Range")
+        ):
+            return False
+        content_type = response.get("Content-Type", "").lower()
+        return not content_type.startswith(INCOMPRESSIBLE_CONTENT_TYPES)
+
+    @staticmethod
+    def carries_secrets(request, response):
+        # `get_token` flags the request when a CSRF token is put in the response, e.g. in a form
+        return bool(request.META.get("CSRF_COOKIE_NEEDS_UPDATE") or response.cookies)
+
+    @staticmethod
+    def negotiate(accept_encoding):
+        accepted = parse_accept_encoding(accept_encoding)
+        for coding in CODINGS:
+            if accepted.get(coding[0], accepted.get("*", 0)) > 0:
+                return coding
+        return None
+
+    @staticmethod
+    def compress_stream(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def compress_async_stream(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
@@ -1,27 +1,408 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
 from collections import OrderedDict
+from functools import reduce
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
 from rest_framework import status
+from rest_framework.pagination import CursorPagination
 from rest_framework.pagination import PageNumberPagination as DRFPageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from backend_service.exceptions import BadRequestExceptionAPIException
+from utils import logger
+from utils.cache import get_model_generation
+
+PAGINATION_COUNT_KEY = "pagination_count:{}:{}:{}"
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds of datetimes, which `DjangoJSONEncoder` truncates to milliseconds: a cursor must hold
+    the exact position, or rows would be skipped or repeated.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def paginated_response(count, next_link, previous_link, results, count_is_exact=True):
+    return Response(
+        data=OrderedDict(
+            [
+                ("success", True),
+                ("code", status.HTTP_200_OK),
+                ("status", "Ok"),
+                ("message", _("Success")),
+                ("count", count),
+                ("count_is_exact", count_is_exact),
+                ("next", next_link),
+                ("previous", previous_link),
+                ("results", results),
+            ]
+        ),
+        status=status.HTTP_200_OK,
+    )
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which doesn't run an exact `COUNT(*)` on big tables.
+
+    - An exact count cached in Redis is used if there is one. Counts are keyed by a hash of the SQL of the query
+      and by the generation of the model, which is bumped on every write (see `utils.cache`).
+    - Otherwise the number of rows is estimated by PostgreSQL: from `pg_class.reltuples` for an unfiltered
+      query, from the row estimate of its plan otherwise. The estimate is used from
+      `settings.PAGINATION_EXACT_COUNT_THRESHOLD` rows.
+    - Below it, the exact count is computed and cached for `settings.PAGINATION_COUNT_CACHE_TIMEOUT` seconds.
+    - An estimate too high is corrected when a page comes back short: the rows before it plus its rows are the
+      exact count, and a page past the last row falls back to an exact count, so that it is a 404 and the
+      previous pages don't link past the end.
+    - An estimate too low is corrected on its last page, and on the pages past it: they fall back to an exact
+      count, so that the last page links to the next one and the pages after it aren't a 404.
+
+    `count_is_exact` tells whether `count` is an estimate.
+    """
+
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or connections[queryset.db].vendor != "postgresql":
+            return super().count
+
+        if queryset.query.is_empty():
+            return 0
+
+        queryset = queryset.order_by()
+        cache_key = self.get_cache_key(queryset)
+        count = self._get_cached_count(cache_key)
+        if count is not None:
+            return count
+
+        estimate = self.get_estimated_count(queryset)
+        if estimate is not None and estimate >= settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+            self.count_is_exact = False
+            return estimate
+
+        count = queryset.count()
+        self._set_cached_count(cache_key, count)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.count_is_exact or int(number) < 1:
+                raise
+        # The estimate may be low, the page is only past the end if it's past the exact count
+        self.set_exact_count(self.object_list.count())
+        return super().validate_number(number)
+
+    def page(self, number):
+        page = super().page(number)
+        if self.count_is_exact:
+            return page
+
+        if len(page) >= self.per_page:
+            # The estimate may be low, the rows can go on past its last page
+            if page.number >= self.num_pages:
+                self.set_exact_count(self.object_list.count())
+            return page
+
+        # The estimate overshot, the real end of the rows is on or before this page
+        if len(page):
+            self.set_exact_count((page.number - 1) * self.per_page + len(page))
+            return page
+        self.set_exact_count(self.object_list.count())
+        return super().page(number)
+
+    def set_exact_count(self, count):
+        self.__dict__["count"] = count
+        self.__dict__.pop("num_pages", None)
+        self.count_is_exact = True
+        queryset = self.object_list.order_by()
+        self._set_cached_count(self.get_cache_key(queryset), count)
+
+    @staticmethod
+    def get_cache_key(queryset):
+        """
+        Returns the cache key of the count of a queryset, or None if it must not be cached.
+        """
+        generation = get_model_generation(queryset.model)
+        if generation is None:
+            return None
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.sha256(f"{sql}{params!r}".encode("utf-8")).hexdigest()
+        return PAGINATION_COUNT_KEY.format(
+            queryset.model._meta.label_lower, generation, digest
+        )
+
+    @staticmethod
+    def get_estimated_count(queryset):
+        """
+        Returns PostgreSQL's estimate of the number of rows of a queryset, or None if there is none.
+        """
+        try:
+            if not queryset.query.where:
+                with connections[queryset.db].cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                # reltuples is -1 until the table is first analyzed
+                return int(row[0]) if row and row[0] >= 0 else None
+
+            plan = json.loads(queryset.explain(format="json"))
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except (DatabaseError, ValueError, KeyError, IndexError) as e:
+            logger.warning("Row count of %s could not be estimated: %s", queryset.model, e)
+            return None
+
+    @staticmethod
+    def _get_cached_count(cache_key):
+        if cache_key is None:
+            return None
+        try:
+            return cache.get(cache_key)
+        except RedisError as e:
+            logger.error("Cached count is skipped as Redis is unavailable: %s", e)
+            return None
+
+    @staticmethod
+    def _set_cached_count(cache_key, count):
+        if cache_key is None:
+            return
+        try:
+            cache.set(cache_key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        except RedisError as e:
+            logger.error("Count could not be cached as Redis is unavailable: %s", e)
 
 
 class PageNumberPagination(DRFPageNumberPagination):
     page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return paginated_response(
+            self.page.paginator.count,
+            self.get_next_link(),
+            self.get_previous_link(),
+            data,
+            count_is_exact=self.page.paginator.count_is_exact,
+        )
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination: every page is fetched with `WHERE (ordering) > (last row of the previous page) LIMIT k`,
+    which uses the index of the ordering and costs the same on page 1000 as on page 1. There is no `COUNT(*)`.
+
+    The ordering is `ordering`, or the one of the view's `OrderingFilter` if it has one. It can be made of any
+    non-nullable fields, of the model or of its forward relations (e.g. `author__name`), ideally indexed together.
+    The primary key is appended when missing, e.g. `-created_at` becomes `(-created_at, -uuid)`, so that rows with
+    equal values are neither skipped nor repeated. Cursors are opaque to clients, and only link to the next and
+    previous pages.
+
+    The response has the envelope of `PageNumberPagination`, with `count` always null and `count_is_exact` false.
+    Opt in per viewset with `pagination_class = KeysetPagination`.
+    """
+
+    ordering = "-created_at"
+    page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+
+    def __init__(self):
+        super().__init__()
+        self.request = None
+        self.base_url = None
+        self.model = None
+        self.next_position = None
+        self.previous_position = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_unique_ordering(self.get_ordering(request, queryset, view))
+        self.check_ordering()
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [_invert(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        # A page reached going backward always has a next page, the one we came from, and vice versa
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self.get_position(results[-1]) if has_next and results else None
+        self.previous_position = self.get_position(results[0]) if has_previous and results else None
+        return results
+
+    def get_unique_ordering(self, ordering):
+        names = [field.lstrip("-") for field in ordering]
+        pk_name = self.model._meta.pk.name
+        if "pk" in names or pk_name in names:
+            return tuple(ordering)
+        descending = ordering[-1].startswith("-")
+        return (*ordering, f"-{pk_name}" if descending else pk_name)
+
+    def check_ordering(self):
+        """
+        Fails early on orderings the cursors can't be made of, instead of on the first page with a next page.
+
+        Raises:
+            ImproperlyConfigured: If a field of the ordering doesn't exist or follows a many-valued relation.
+        """
+        for field in self.ordering:
+            try:
+                self._get_field(field.lstrip("-"))
+            except FieldDoesNotExist as exc:
+                raise ImproperlyConfigured(
+                    f"Keyset pagination can't order {self.model.__name__} by {field}: {exc}"
+                ) from exc
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """
+        Builds `(a, b, c) > (x, y, z)` as `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`, with `<`
+        instead of `>` for descending fields.
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equalities = {
+                previous.lstrip("-"): value
+                for previous, value in zip(ordering[:index], position)
+            }
+            conditions.append(Q(**equalities, **{f"{name}__{lookup}": position[index]}))
+        return reduce(lambda left, right: left | right, conditions)
+
+    def get_position(self, instance):
+        return [get_lookup_value(instance, field.lstrip("-")) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        """
+        Returns the (position, reverse) of the cursor in the request, or (None, False) for the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values, reverse = cursor["p"], bool(cursor.get("r"))
+            if len(values) != len(self.ordering):
+                raise ValueError("Cursor doesn't match the ordering")
+            position = [
+                self._get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (
+            TypeError,
+            ValueError,
+            KeyError,
+            UnicodeEncodeError,
+            binascii.Error,
+            FieldDoesNotExist,
+            ValidationError,
+        ) as exc:
+            raise BadRequestExceptionAPIException(self.invalid_cursor_message) from exc
+        return position, reverse
+
+    def get_cursor_link(self, position, reverse=False):
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.get_cursor(position, reverse),
+        )
+
+    @staticmethod
+    def get_cursor(position, reverse=False) -> str:
+        """
+        Returns the opaque cursor of a position, i.e. the values of the ordering fields of a row.
+        """
+        cursor = {"p": position}
+        if reverse:
+            cursor["r"] = 1
+        encoded = json.dumps(cursor, cls=CursorJSONEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(encoded.encode("utf-8")).decode("ascii")
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.get_cursor_link(self.next_position)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.get_cursor_link(self.previous_position, reverse=True)
 
     def get_paginated_response(self, data):
-        return Response(
-            data=OrderedDict(
-                [
-                    ("success", True),
-                    ("code", status.HTTP_200_OK),
-                    ("status", "Ok"),
-                    ("message", _("Success")),
-                    ("count", self.page.paginator.count),
-                    ("next", self.get_next_link()),
-                    ("previous", self.get_previous_link()),
-                    ("results", data),
-                ]
-            ),
-            status=status.HTTP_200_OK,
+        return paginated_response(
+            None,
+            self.get_next_link(),
+            self.get_previous_link(),
+            data,
+            count_is_exact=False,
         )
+
+    def _get_field(self, name):
+        if name == "pk":
+            return self.model._meta.pk
+        model = self.model
+        *relations, attr = name.split("__")
+        for relation in relations:
+            field = model._meta.get_field(relation)
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                raise FieldDoesNotExist(f"{relation} isn't a forward relation of {model.__name__}")
+            model = field.related_model
+        return model._meta.get_field(attr)
+
+
+def get_lookup_value(instance, lookup):
+    """
+    Returns the value of a field lookup on an instance, following forward relations, e.g. `author__name`.
+    """
+    if lookup == "pk":
+        return instance.pk
+    value = instance
+    for attr in lookup.split("__"):
+        if value is None:
+            return None
+        value = getattr(value, attr)
+    return value
+
+
+def _invert(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
@@ -0,0 +1,49 @@
+import decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson serializes str, int, float, bool, None, dict, list, tuple, UUID and datetime natively (and their
+# subclasses, e.g. DRF's ReturnDict), only the other types go through `default`
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_fallback_encoder = JSONEncoder()
+
+
+def default(obj):
+    """
+    Serializes the types orjson doesn't know, the way DRF's `JSONEncoder` does.
+    """
+    if isinstance(obj, Promise):
+        # Lazy translation strings
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        # As a string, like DRF's DecimalField and Django's JsonResponse, so that no precision is lost
+        return str(obj)
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data, indent=False) -> bytes:
+    """
+    Serializes `data` to UTF-8 JSON bytes with orjson.
+    """
+    option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=default, option=option)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Renders JSON with orjson, several times faster than the standard library for list payloads.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        ret = dumps(data, indent=bool(indent))
+        # Same as DRF: escape the two characters which are valid in JSON but not in JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
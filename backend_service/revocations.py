@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from utils.redis_client import RedisSubscriber, publish
+
+
+class TokenRevocationIndex:
+    """
+    In-memory set of the JTIs of the blacklisted tokens which haven't expired yet, kept by every worker.
+
+    It is seeded from the token blacklist tables, kept current through Redis pub/sub as tokens are blacklisted,
+    and fully reloaded every `settings.TOKEN_REVOCATION_RESYNC_INTERVAL` seconds. Only a JTI found in the index
+    needs to be confirmed against the database. Until the index is loaded, or while it is disconnected from Redis,
+    every JTI is reported as possibly revoked so that callers fall back to the database.
+    """
+
+    def __init__(self):
+        self._jtis = set()
+        self._loaded_at = None
+        self.subscriber = RedisSubscriber(
+            settings.TOKEN_REVOCATION_CHANNEL,
+            on_message=self.add,
+            on_connect=self.load,
+            refresh_interval=settings.TOKEN_REVOCATION_RESYNC_INTERVAL,
+        )
+
+    def load(self):
+        self._jtis = set(
+            BlacklistedToken.objects.filter(
+                token__expires_at__gt=timezone.now()
+            ).values_list("token__jti", flat=True)
+        )
+        self._loaded_at = time.monotonic()
+
+    def add(self, jti):
+        if isinstance(jti, bytes):
+            jti = jti.decode()
+        self._jtis.add(jti)
+
+    def might_be_revoked(self, jti) -> bool:
+        self.subscriber.ensure_started()
+        if not self.subscriber.connected or self._loaded_at is None:
+            return True
+        return jti in self._jtis
+
+    def revoke(self, jti):
+        """
+        Adds a JTI to the index of this worker and broadcasts it to the others.
+        """
+        self.add(jti)
+        publish(settings.TOKEN_REVOCATION_CHANNEL, jti)
+
+
+revocation_index = TokenRevocationIndex()
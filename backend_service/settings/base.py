@@ -87,6 +87,13 @@ if FRONTEND_APP_DOMAINS:
 # It's used by IPAddressAuthentication class which is used for IP address based authentication.
 WHITELISTED_IP_ADDRESSES = ENV.list("WHITELISTED_IP_ADDRESSES", default=[])
 WHITELISTED_CIDR = ENV.list("WHITELISTED_CIDR", default=[])
+# IP addresses or CIDR blocks of internal callers which are never throttled.
+THROTTLE_TRUSTED_IP_ADDRESSES = ENV.list("THROTTLE_TRUSTED_IP_ADDRESSES", default=[])
+# Number of proxies (load balancers) in front of the service, which append to X-Forwarded-For. The address of the
+# caller is read from the header only when it is set, from the connection otherwise.
+TRUSTED_PROXY_COUNT = ENV.int("TRUSTED_PROXY_COUNT", default=0)
+# Number of recent decisions each compiled IP allow list remembers.
+IP_ALLOW_LIST_CACHE_SIZE = ENV.int("IP_ALLOW_LIST_CACHE_SIZE", default=1024)
 
 # If True, the SecurityMiddleware redirects all non-HTTPS requests to HTTPS
 # (except for those URLs matching a regular expression listed in SECURE_REDIRECT_EXEMPT).
@@ -223,6 +230,7 @@ INSTALLED_APPS = (
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # CORS Middleware
     "django.middleware.security.SecurityMiddleware",  # Django Security Middleware
+    "backend_service.middleware.CompressionMiddleware",  # Response Compression Middleware
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Whitenoise Middleware
     "django.contrib.sessions.middleware.SessionMiddleware",  # Django Session Middleware
     "django.middleware.locale.LocaleMiddleware",  # Django Locale Middleware
@@ -233,6 +241,10 @@ MIDDLEWARE = [
     "backend_service.middleware.LoggingMiddleware",  # Logging Middleware
 ]
 
+# Responses are compressed from COMPRESSION_MIN_SIZE bytes, and with a cheaper level from COMPRESSION_LARGE_SIZE
+COMPRESSION_MIN_SIZE = ENV.int("COMPRESSION_MIN_SIZE", default=1024)
+COMPRESSION_LARGE_SIZE = ENV.int("COMPRESSION_LARGE_SIZE", default=1024 * 1024)
+
 # HEALTH CHECKS
 # ------------------------------------------------------------------------------
 # Kubernetes Health Checks in Django
@@ -361,13 +373,63 @@ if SECONDARY_POSTGRES_HOST:
     }
     DATABASE_ROUTERS = ["backend_service.routers.database.MasterSlaveRouter"]
 
+# Redis, with an in-process tier in front of it for hot keys (see `backend_service.caches`). Copies are dropped
+# by every worker when a key is written, and kept for at most CACHE_LOCAL_TIMEOUT seconds. Only the keys of
+# CACHE_LOCAL_KEY_PREFIXES go through the in-process tier: rendered responses and counts, whose keys contain
+# the generation of their model and so are never overwritten.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "backend_service.caches.TwoTierRedisCache",
         "LOCATION": REDIS_URL,
+        "OPTIONS": {
+            "LOCAL_KEY_PREFIXES": ENV.list(
+                "CACHE_LOCAL_KEY_PREFIXES", default=["response:", "pagination_count:"]
+            ),
+            "LOCAL_MAX_SIZE": ENV.int("CACHE_LOCAL_MAX_SIZE", default=4096),
+            "LOCAL_TIMEOUT": ENV.int("CACHE_LOCAL_TIMEOUT", default=30),  # seconds
+            "LOCAL_MAX_VALUE_SIZE": ENV.int("CACHE_LOCAL_MAX_VALUE_SIZE", default=16 * 1024),  # bytes
+            "INVALIDATION_CHANNEL": ENV.str(
+                "CACHE_INVALIDATION_CHANNEL", default="cache_invalidations"
+            ),
+        },
     }
 }
 
+# Stampede protection of `utils.cache.get_or_compute`: one process recomputes an expired key while the others
+# serve the stale value, for at most CACHE_STALE_TIMEOUT seconds, or wait for it up to CACHE_LOCK_WAIT seconds
+CACHE_STALE_TIMEOUT = ENV.int("CACHE_STALE_TIMEOUT", default=60)  # seconds
+CACHE_LOCK_TIMEOUT = ENV.int("CACHE_LOCK_TIMEOUT", default=10)  # seconds
+CACHE_LOCK_WAIT = ENV.float("CACHE_LOCK_WAIT", default=2.0)  # seconds
+# Number of seconds missing objects and other cached exceptions are cached for
+CACHE_NEGATIVE_TIMEOUT = ENV.int("CACHE_NEGATIVE_TIMEOUT", default=30)
+# Eagerness of the probabilistic early expiration (XFetch), 0 disables it
+CACHE_XFETCH_BETA = ENV.float("CACHE_XFETCH_BETA", default=1.0)
+
+# Read-mostly data shared by the workers of a host through memory-mapped files (see `utils.snapshots`), rebuilt
+# by a single process when one of its models is written or after SNAPSHOT_MAX_AGE seconds. Workers look for a new
+# snapshot every SNAPSHOT_CHECK_INTERVAL seconds. The directory must be local to the host, ideally in memory, and
+# only accessible to the user of the workers; it is created with mode 0700, and snapshots aren't used if it is owned
+# by another user or accessible to others (see `utils.snapshots.ensure_private_directory`), hence the nosec.
+SNAPSHOT_DIR = ENV.str("SNAPSHOT_DIR", default="/dev/shm/backend_service")  # nosec B108
+SNAPSHOT_MAX_AGE = ENV.int("SNAPSHOT_MAX_AGE", default=300)  # seconds
+SNAPSHOT_CHECK_INTERVAL = ENV.int("SNAPSHOT_CHECK_INTERVAL", default=5)  # seconds
+
+# Authenticated users are cached in-process and in Redis, to avoid a database query per request.
+# USER_CACHE_LOCAL_TIMEOUT bounds how long other workers may serve a user after it changes.
+USER_CACHE_TIMEOUT = ENV.int("USER_CACHE_TIMEOUT", default=300)  # seconds
+USER_CACHE_LOCAL_TIMEOUT = ENV.int("USER_CACHE_LOCAL_TIMEOUT", default=5)  # seconds
+USER_CACHE_LOCAL_MAX_SIZE = ENV.int("USER_CACHE_LOCAL_MAX_SIZE", default=1024)
+# Bump to discard every cached user, e.g. after a change of the user model
+USER_CACHE_VERSION = ENV.int("USER_CACHE_VERSION", default=2)
+
+# Results of `Model.cached` querysets are cached in-process and in Redis until a table they read is written.
+# QUERYSET_CACHE_LOCAL_TIMEOUT bounds how long other workers may serve them after the write.
+QUERYSET_CACHE_TIMEOUT = ENV.int("QUERYSET_CACHE_TIMEOUT", default=300)  # seconds
+QUERYSET_CACHE_LOCAL_TIMEOUT = ENV.int("QUERYSET_CACHE_LOCAL_TIMEOUT", default=5)  # seconds
+QUERYSET_CACHE_LOCAL_MAX_SIZE = ENV.int("QUERYSET_CACHE_LOCAL_MAX_SIZE", default=512)
+# Results which pickle to more bytes than this aren't cached
+QUERYSET_CACHE_MAX_BYTES = ENV.int("QUERYSET_CACHE_MAX_BYTES", default=64 * 1024)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -393,33 +455,107 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "backend_service.hashers.Argon2PasswordHasher",
 ]
 
+# Argon2 cost parameters: number of iterations, memory in KiB and number of lanes. Defaults are Django's.
+PASSWORD_ARGON2_TIME_COST = ENV.int("PASSWORD_ARGON2_TIME_COST", default=2)
+PASSWORD_ARGON2_MEMORY_COST = ENV.int("PASSWORD_ARGON2_MEMORY_COST", default=102400)
+PASSWORD_ARGON2_PARALLELISM = ENV.int("PASSWORD_ARGON2_PARALLELISM", default=8)
+
+# Basic authentication verifies passwords on a pool of PASSWORD_VERIFICATION_WORKERS threads, and rejects
+# requests with a 429 once PASSWORD_VERIFICATION_QUEUE_SIZE more are waiting. Verified credentials are
+# remembered for BASIC_AUTH_CACHE_TIMEOUT seconds, so that repeated calls don't hash the password again.
+PASSWORD_VERIFICATION_WORKERS = ENV.int("PASSWORD_VERIFICATION_WORKERS", default=4)
+PASSWORD_VERIFICATION_QUEUE_SIZE = ENV.int("PASSWORD_VERIFICATION_QUEUE_SIZE", default=16)
+BASIC_AUTH_CACHE_TIMEOUT = ENV.int("BASIC_AUTH_CACHE_TIMEOUT", default=60)
+BASIC_AUTH_CACHE_MAX_SIZE = ENV.int("BASIC_AUTH_CACHE_MAX_SIZE", default=1024)
+
 AUTHENTICATION_BACKENDS = [
     # Django ModelBackend is the default authentication backend.
     "django.contrib.auth.backends.ModelBackend",
 ]
 
+# Upper bound of the page size clients can request with `page_size`
+MAX_PAGE_SIZE = ENV.int("MAX_PAGE_SIZE", default=100)
+
+# Number of seconds list and retrieve responses of viewsets with `cache_responses` are cached for, at most: they
+# are invalidated as soon as the organisation writes the model
+RESPONSE_CACHE_TIMEOUT = ENV.int("RESPONSE_CACHE_TIMEOUT", default=600)
+
+# Maximum number of rows per INSERT or UPDATE when creating or updating items in bulk, and
+# maximum number of items of a bulk update or delete request
+BULK_CREATE_BATCH_SIZE = ENV.int("BULK_CREATE_BATCH_SIZE", default=500)
+BULK_UPDATE_BATCH_SIZE = ENV.int("BULK_UPDATE_BATCH_SIZE", default=500)
+BULK_MAX_ITEMS = ENV.int("BULK_MAX_ITEMS", default=1000)
+
+# Paginated responses report PostgreSQL's row estimate instead of an exact count from this many rows.
+# Exact counts are cached for PAGINATION_COUNT_CACHE_TIMEOUT seconds, or until the model is written.
+PAGINATION_EXACT_COUNT_THRESHOLD = ENV.int("PAGINATION_EXACT_COUNT_THRESHOLD", default=10000)
+PAGINATION_COUNT_CACHE_TIMEOUT = ENV.int("PAGINATION_COUNT_CACHE_TIMEOUT", default=300)
+
 REST_FRAMEWORK = {
+    # Dispatches to Basic, JWT or session authentication from the Authorization header or the session cookie
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.BasicAuthentication",
-        "rest_framework.authentication.SessionAuthentication",
-        "backend_service.authentication.JWTAuthentication",
+        "backend_service.authentication.SchemeDispatchAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("backend_service.permissions.IsAuthenticated",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "backend_service.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "backend_service.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "backend_service.pagination.PageNumberPagination",
     "PAGE_SIZE": ENV.int("DEFAULT_PAGE_SIZE", default=20),
+    # Views which need organisation and global quotas opt in to HierarchicalRateThrottle
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.ScopedRateThrottle",
+        "backend_service.throttling.ScopedRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "standard": ENV.str("STANDARD_THROTTLE_RATE", default="500/minute"),
         "auth": ENV.str("AUTH_THROTTLE_RATE", default="5/minute"),
+        # Quotas shared by all the users of an organisation, and by everyone, across all scopes
+        "organisation": ENV.str("ORGANISATION_THROTTLE_RATE", default="5000/minute"),
+        "global": ENV.str("GLOBAL_THROTTLE_RATE", default=None),
     },
     "EXCEPTION_HANDLER": "backend_service.exceptions.exception_handler",
 }
 
+# Throttling leases quota from Redis in chunks of at most this many requests per worker,
+# and keeps at most this many local buckets per worker
+THROTTLE_LEASE_SIZE = ENV.int("THROTTLE_LEASE_SIZE", default=10)
+THROTTLE_LOCAL_BUCKETS_MAX = ENV.int("THROTTLE_LOCAL_BUCKETS_MAX", default=10000)
+
+# Pool of keep-alive connections of the shared HTTP session, and circuit breaker of outgoing calls:
+# a host is not called for HTTP_CIRCUIT_BREAKER_RESET_TIMEOUT seconds after that many consecutive failures
+HTTP_POOL_CONNECTIONS = ENV.int("HTTP_POOL_CONNECTIONS", default=10)
+HTTP_POOL_MAXSIZE = ENV.int("HTTP_POOL_MAXSIZE", default=20)
+HTTP_CIRCUIT_BREAKER_THRESHOLD = ENV.int("HTTP_CIRCUIT_BREAKER_THRESHOLD", default=5)
+HTTP_CIRCUIT_BREAKER_RESET_TIMEOUT = ENV.int("HTTP_CIRCUIT_BREAKER_RESET_TIMEOUT", default=30)
+
+# Stateless authentication caches the payloads of the authentication app for AUTHENTICATION_APP_CACHE_TIMEOUT
+# seconds, and keeps serving them for AUTHENTICATION_APP_STALE_TIMEOUT more seconds while the app is failing
+AUTHENTICATION_APP_CACHE_TIMEOUT = ENV.int("AUTHENTICATION_APP_CACHE_TIMEOUT", default=60)
+AUTHENTICATION_APP_STALE_TIMEOUT = ENV.int("AUTHENTICATION_APP_STALE_TIMEOUT", default=300)
+AUTHENTICATION_APP_REQUEST_TIMEOUT = ENV.int("AUTHENTICATION_APP_REQUEST_TIMEOUT", default=5)
+
+# Maximum number of verified access tokens each worker keeps, until they expire
+VERIFIED_TOKEN_CACHE_MAX_SIZE = ENV.int("VERIFIED_TOKEN_CACHE_MAX_SIZE", default=10000)
+
+# Blacklisted tokens are broadcast to every worker on this Redis channel, and each worker
+# reloads the full list of blacklisted tokens every TOKEN_REVOCATION_RESYNC_INTERVAL seconds
+TOKEN_REVOCATION_CHANNEL = ENV.str("TOKEN_REVOCATION_CHANNEL", default="token_revocations")
+TOKEN_REVOCATION_RESYNC_INTERVAL = ENV.int("TOKEN_REVOCATION_RESYNC_INTERVAL", default=300)
+
+# Codec used to encode the custom claim of the tokens issued by this service: "2" (deflate with a preset
+# dictionary), "1" (deflate) or "gzip" (the original format). Tokens in any of them are decoded. Keep "gzip"
+# until every service reading our tokens can decode the versioned formats.
+CUSTOM_CLAIM_CODEC = ENV.str("CUSTOM_CLAIM_CODEC", default="gzip")
+
 SIMPLE_JWT = {
     "ALGORITHM": "HS512",
     "USER_ID_FIELD": "uuid",
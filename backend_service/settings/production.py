@@ -42,4 +42,4 @@ sentry_sdk.init(
 )
 
 # This disables the "browsable" api that can cause various production issues
-REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = ("rest_framework.renderers.JSONRenderer",)
+REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = ("backend_service.renderers.ORJSONRenderer",)
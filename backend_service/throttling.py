@@ -1,13 +1,101 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
 from rest_framework.throttling import ScopedRateThrottle as DefaultScopedRateThrottle
 
 from backend_service.exceptions import APIException, ThrottledAPIException
 from utils.constants import CLIENT_THROTTLE_SCOPE
+from utils.ip_addresses import get_ip_allow_list
+from utils.redis_client import get_redis_client
+from utils.request_helpers import get_client_ip_address
+
+logger = logging.getLogger("default")
+
+# GCRA (generic cell rate algorithm) in a single atomic step. The key holds the "theoretical arrival time" (TAT)
+# of the next request; a request is allowed if it does not push the TAT further than `delay_tolerance` ahead of
+# now. The Redis server clock is used so that workers with skewed clocks still agree with each other.
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local emission_interval = tonumber(ARGV[1])
+local delay_tolerance = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission_interval
+local wait = new_tat - delay_tolerance - now
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class GCRARateLimiter:
+    """
+    Rate limiter running the GCRA check as one Lua script per request.
+
+    Compared to a list of request timestamps, only a single float is stored per key, and the read-modify-write
+    happens inside Redis, so concurrent workers can't leak requests past the limit.
+    """
+
+    def __init__(self):
+        self._script = None
+
+    def get_script(self):
+        """
+        Returns the Lua script, registered on first use so that importing the module doesn't connect to Redis.
+        """
+        if self._script is None:
+            self._script = get_redis_client().register_script(GCRA_SCRIPT)
+        return self._script
+
+    def consume(self, key, num_requests, duration):
+        """
+        Try to consume one request from the limit of `key`.
+
+        Args:
+            key (str): The throttle key.
+            num_requests (int): Number of requests allowed per `duration`.
+            duration (int): The window in seconds.
+
+        Returns:
+            tuple: A tuple of a boolean telling if the request is allowed, and the number of seconds to wait
+            before the next request would be allowed (0 when allowed).
+        """
+        emission_interval = duration / num_requests
+        allowed, wait = self.get_script()(keys=[key], args=[emission_interval, duration])
+        return bool(allowed), float(wait)
 
 
 class ScopedRateThrottle(DefaultScopedRateThrottle):
+    """
+    Scoped throttle backed by an atomic GCRA check in Redis.
+
+    DRF's default implementation keeps the request history of every key as a list in the cache and rewrites it on
+    each request, which is O(n) per call and racy across workers. Scopes, `request.user.throttle_rate` for the
+    client scope and the `ThrottledAPIException` response are unchanged.
+    """
+
+    limiter = GCRARateLimiter()
+
     def __init__(self):
         super().__init__()
         self.request = None
+        self.scope = None
+        self.rate = None
+        self.num_requests = None
+        self.duration = None
+        self.key = None
+        self._wait = None
 
     def get_rate(self):
         """
@@ -35,7 +123,230 @@ class ScopedRateThrottle(DefaultScopedRateThrottle):
         Override to send a custom response when throttling is necessary.
         """
         self.request = request
-        if super().allow_request(request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope or self.is_trusted(request):
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        if self.consume_request():
             return True
 
         raise ThrottledAPIException(wait=self.wait())
+
+    def get_cache_key(self, request, view):
+        """
+        Key authenticated requests on the user's uuid, which token claims carry, so that throttling doesn't need
+        to load the user.
+        """
+        if request.user and request.user.is_authenticated:
+            ident = request.user.uuid
+        else:
+            ident = self.get_ident(request)
+
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def is_trusted(self, request):
+        """
+        Internal callers listed in `settings.THROTTLE_TRUSTED_IP_ADDRESSES` (addresses or CIDR blocks) are never
+        throttled. The address is the one of the connection, or the one appended by the trusted proxies, never
+        the client supplied part of `X-Forwarded-For` which `get_ident` may return.
+        """
+        ip_address = get_client_ip_address(request, settings.TRUSTED_PROXY_COUNT)
+        return ip_address in get_ip_allow_list("THROTTLE_TRUSTED_IP_ADDRESSES")
+
+    def consume_request(self):
+        """
+        Consume one request for `self.key`. Throttling fails open if Redis is unreachable, so that an outage of
+        the cache doesn't take the whole API down with it.
+        """
+        try:
+            allowed, self._wait = self.limiter.consume(
+                self.key, self.num_requests, self.duration
+            )
+        except RedisError as e:
+            logger.error("Throttling is skipped as Redis is unavailable: %s", e)
+            return True
+        return allowed
+
+    def wait(self):
+        """
+        Returns the recommended next request time in seconds.
+        """
+        return self._wait
+
+
+# Lease up to ARGV[1] requests from every quota in KEYS at once. Each key holds the GCRA "theoretical arrival time" of
+# its level, described by an (emission interval, delay tolerance) pair in ARGV, as in GCRA_SCRIPT. The grant is the
+# smallest number of requests every level can take right now, so a lease never overdraws the user, the organisation
+# or the global quota, and every TAT is pushed by the granted amount. Returns the granted amount and, in seconds,
+# either how long the lease is valid for or how long to wait when nothing could be granted.
+LEASE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local grant = tonumber(ARGV[1])
+local wait = 0
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local emission_interval = tonumber(ARGV[i * 2])
+    local delay_tolerance = tonumber(ARGV[i * 2 + 1])
+    local tat = tonumber(redis.call('GET', key))
+    if not tat or tat < now then
+        tat = now
+    end
+    tats[i] = tat
+    local available = math.floor((now + delay_tolerance - tat) / emission_interval + 1e-9)
+    if available < grant then
+        grant = available
+    end
+    if available <= 0 then
+        wait = math.max(wait, tat + emission_interval - delay_tolerance - now)
+    end
+end
+if grant <= 0 then
+    return {0, tostring(wait)}
+end
+
+for i, key in ipairs(KEYS) do
+    local new_tat = tats[i] + grant * tonumber(ARGV[i * 2])
+    redis.call('SET', key, tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+end
+-- Leased requests are valid for as long as the innermost level takes to earn them
+return {grant, tostring(grant * tonumber(ARGV[2]))}
+"""
+
+
+class QuotaLeaseLimiter:
+    """
+    Two level rate limiter: an in-process token bucket per key, refilled by leasing chunks of quota from nested
+    GCRA limits in Redis.
+
+    Most requests are served from the local bucket without touching the network. Only when a bucket runs dry does
+    the worker lease the next chunk, atomically against every level of the hierarchy. Denials are remembered
+    locally until the next request would be allowed, so a throttled client doesn't cost a round-trip either.
+
+    The trade-off is that tokens leased by one worker can't be used by another; leases are kept small relative to
+    the limit (see `lease_size`) to bound that slack.
+    """
+
+    def __init__(self):
+        self._script = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get_script(self):
+        """
+        Returns the Lua script, registered on first use so that importing the module doesn't connect to Redis.
+        """
+        if self._script is None:
+            self._script = get_redis_client().register_script(LEASE_SCRIPT)
+        return self._script
+
+    @staticmethod
+    def lease_size(num_requests):
+        """
+        Number of requests leased at once; one tenth of the limit, capped by `settings.THROTTLE_LEASE_SIZE`.
+        Tight limits such as the auth scope end up leasing a single request, which keeps them exact.
+        """
+        return max(1, min(settings.THROTTLE_LEASE_SIZE, num_requests // 10))
+
+    def consume(self, key, quotas):
+        """
+        Try to consume one request for `key`.
+
+        Args:
+            key (str): The key of the local bucket, usually the key of the innermost quota.
+            quotas (list): A list of (key, num_requests, duration) tuples, innermost level first.
+
+        Returns:
+            tuple: A tuple of a boolean telling if the request is allowed, and the number of seconds to wait
+            before the next request would be allowed (0 when allowed).
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, expires_at, denied = self._buckets.get(key, (0, now, False))
+            if expires_at > now:
+                if denied:
+                    return False, expires_at - now
+                if tokens > 0:
+                    self._buckets[key] = (tokens - 1, expires_at, False)
+                    return True, 0
+
+        args = [self.lease_size(quotas[0][1])]
+        for _, num_requests, duration in quotas:
+            args.extend([duration / num_requests, duration])
+        granted, seconds = self.get_script()(
+            keys=[quota[0] for quota in quotas], args=args
+        )
+        granted, expires_at = int(granted), now + max(float(seconds), 0)
+
+        with self._lock:
+            if granted <= 0:
+                self._buckets[key] = (0, expires_at, True)
+                return False, expires_at - now
+            # Another thread may have leased for the same key meanwhile, keep its tokens too
+            tokens, previous_expires_at, denied = self._buckets.get(key, (0, now, False))
+            if previous_expires_at > now and not denied:
+                granted += tokens
+                expires_at = max(expires_at, previous_expires_at)
+            self._buckets[key] = (granted - 1, expires_at, False)
+            self._evict_expired(now)
+        return True, 0
+
+    def _evict_expired(self, now):
+        # Keep the number of local buckets bounded by dropping expired ones every now and then
+        if len(self._buckets) > settings.THROTTLE_LOCAL_BUCKETS_MAX:
+            self._buckets = {
+                key: bucket for key, bucket in self._buckets.items() if bucket[1] > now
+            }
+
+
+class HierarchicalRateThrottle(ScopedRateThrottle):
+    """
+    Scoped throttle enforcing nested quotas: the caller's scope rate inside an organisation quota inside a global
+    quota, using `QuotaLeaseLimiter` so that most requests don't pay a Redis round-trip.
+
+    The organisation and global levels are scope independent and use the `organisation` and `global` entries of
+    `DEFAULT_THROTTLE_RATES`; a level without a rate is not enforced. The organisation is the one the JWT layer
+    records for the request (`organisation_id` of the authenticated user), so one tenant can't starve the others.
+    Opt in per view with `throttle_classes`, the default is the exact `ScopedRateThrottle`.
+    """
+
+    ORGANISATION_SCOPE = "organisation"
+    GLOBAL_SCOPE = "global"
+
+    limiter = QuotaLeaseLimiter()
+
+    def consume_request(self):
+        quotas = [(self.key, self.num_requests, self.duration)]
+
+        organisation_id = getattr(self.request.user, "organisation_id", None)
+        if organisation_id:
+            quotas += self.get_quota(
+                self.ORGANISATION_SCOPE, f"organisation_{organisation_id}"
+            )
+        quotas += self.get_quota(self.GLOBAL_SCOPE, self.GLOBAL_SCOPE)
+
+        try:
+            allowed, self._wait = self.limiter.consume(self.key, quotas)
+        except RedisError as e:
+            logger.error("Throttling is skipped as Redis is unavailable: %s", e)
+            return True
+        return allowed
+
+    def get_quota(self, scope, ident):
+        """
+        Returns the quota of an outer level as a list of zero or one (key, num_requests, duration) tuple.
+        """
+        num_requests, duration = self.parse_rate(self.THROTTLE_RATES.get(scope))
+        if num_requests is None:
+            return []
+        key = self.cache_format % {"scope": scope, "ident": ident}
+        return [(key, num_requests, duration)]
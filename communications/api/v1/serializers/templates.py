@@ -2,6 +2,7 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
 from communications.models import Template
+from utils.serializers import BulkCreateListSerializer
 
 
 class TemplateSerializer(serializers.ModelSerializer):
@@ -14,6 +15,7 @@ class TemplateSerializer(serializers.ModelSerializer):
             "language",
             "content",
         )
+        list_serializer_class = BulkCreateListSerializer
 
     def validate(self, attrs):
         attrs = super().validate(attrs)
@@ -1,10 +1,9 @@
-from rest_framework.routers import SimpleRouter
-
 from communications.api.v1.viewsets import TemplateViewSet
+from utils.routers import BulkRouter
 
 app_name = "communications"
 
-router = SimpleRouter()
+router = BulkRouter()
 router.register(r"templates", TemplateViewSet, basename="template")
 
 urlpatterns = []
@@ -4,10 +4,11 @@ from rest_framework.filters import SearchFilter
 from communications.api.v1.filters import TemplateFilter
 from communications.api.v1.serializers import TemplateSerializer
 from communications.models import Template
+from utils.mixins import BulkDestroyModelMixin, BulkUpdateModelMixin
 from utils.viewsets import ModelViewSet
 
 
-class TemplateViewSet(ModelViewSet):
+class TemplateViewSet(BulkUpdateModelMixin, BulkDestroyModelMixin, ModelViewSet):
     serializer_class = TemplateSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_class = TemplateFilter
@@ -15,10 +16,12 @@ class TemplateViewSet(ModelViewSet):
         "uuid",
         "name",
     ]
+    claims_user_actions = ("list", "retrieve")
+    cache_responses = True
 
     def get_queryset(self):
         self.queryset = Template.objects.filter(
-            organisation=self.request.user.organisation,
+            organisation_id=self.request.user.organisation_id,
             business_unit=self.request.user.business_unit,
         )
         return super().get_queryset()
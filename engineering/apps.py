@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class EngineeringConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "engineering"
+
+    def ready(self):
+        # Connect the signal receivers keeping the caches up to date
+        # pylint: disable=import-outside-toplevel,unused-import
+        import utils.signals  # noqa: F401
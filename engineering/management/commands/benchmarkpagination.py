@@ -0,0 +1,67 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend_service.pagination import KeysetPagination, PageNumberPagination
+
+
+class Command(BaseCommand):
+    """
+    Use this management command to compare the latency of a deep page with the offset paginator and with the
+    keyset paginator, on an existing table.
+    """
+
+    help = "Compare the latency of a deep page with offset and keyset pagination."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="communications.CommunicationLog")
+        parser.add_argument("--page", type=int, default=1000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        model = apps.get_model(options["model"])
+        page, page_size = options["page"], options["page_size"]
+        factory = APIRequestFactory()
+        queryset, cursor = self.get_keyset_cursor(model, page, page_size)
+
+        paginations = (
+            (PageNumberPagination, {"page": page, "page_size": page_size}),
+            (KeysetPagination, {"cursor": cursor, "page_size": page_size}),
+        )
+        for pagination_class, params in paginations:
+            timings = []
+            for _ in range(options["repeat"]):
+                request = Request(factory.get("/", params))
+                started = time.perf_counter()
+                list(pagination_class().paginate_queryset(queryset, request))
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{pagination_class.__name__}: page {page} in "
+                f"{min(timings) * 1000:.1f} ms (best of {options['repeat']})"
+            )
+
+    @staticmethod
+    def get_keyset_cursor(model, page, page_size):
+        """
+        Returns the rows in the order of the keyset paginator, and the cursor a client would hold for the page,
+        i.e. the position of the last row of the previous page.
+        """
+        keyset_pagination = KeysetPagination()
+        keyset_pagination.model = model
+        keyset_pagination.ordering = keyset_pagination.get_unique_ordering(
+            (keyset_pagination.ordering,)
+        )
+        queryset = model._meta.default_manager.order_by(*keyset_pagination.ordering)
+        try:
+            previous_row = queryset[(page - 1) * page_size - 1]
+        except IndexError as exc:
+            raise CommandError(
+                f"{model.__name__} has less than {(page - 1) * page_size} rows"
+            ) from exc
+        return queryset, keyset_pagination.get_cursor(
+            keyset_pagination.get_position(previous_row)
+        )
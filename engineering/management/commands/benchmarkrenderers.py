@@ -0,0 +1,64 @@
+import datetime
+import decimal
+import json
+import timeit
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+
+from backend_service.renderers import ORJSONRenderer
+from utils.responses import success_response
+
+
+def build_rows(count):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {
+            "uuid": uuid.uuid4(),
+            "name": f"Template {index}",
+            "content": "Hello {{ first_name }}, your order has been shipped. " * 4,
+            "status": _("Active"),
+            "price": decimal.Decimal("19.99"),
+            "created_at": now,
+            "updated_at": now,
+            "tags": ["order", "shipping", "email"],
+            "is_active": True,
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Use this management command to compare the time spent serializing list payloads with the standard library
+    JSON encoders and with orjson.
+    """
+
+    help = "Compare the serialization time of list payloads with the stdlib JSON encoders and with orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=100)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        rows = build_rows(options["rows"])
+        payload = {"success": True, "code": 200, "status": "Ok", "results": rows}
+
+        candidates = (
+            ("DRF JSONRenderer", lambda: JSONRenderer().render(payload)),
+            ("ORJSONRenderer", lambda: ORJSONRenderer().render(payload)),
+            (
+                "json + DjangoJSONEncoder",
+                lambda: json.dumps({"data": rows}, cls=DjangoJSONEncoder),
+            ),
+            ("success_response", lambda: success_response(data=rows)),
+        )
+        for label, serialize in candidates:
+            elapsed = timeit.timeit(serialize, number=iterations)
+            self.stdout.write(
+                f"{label:<26} {elapsed / iterations * 1000:7.2f} ms per {len(rows)} rows"
+            )
@@ -0,0 +1,73 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from utils.tokens import CLAIM_CODECS, decode_claim
+
+# Realistic custom claims, from a plain member up to an administrator with many permissions
+ROLE_PAYLOADS = {
+    "member": {
+        "role": {"name": "user", "permissions": ["templates.view"]},
+        "organisation_id": "5f0b9c1e-3c2a-4a8e-9f7e-2b1d2c3e4f5a",
+        "business_unit": "7",
+    },
+    "manager": {
+        "role": {
+            "name": "manager",
+            "is_admin": False,
+            "permissions": [
+                "templates.view",
+                "templates.add",
+                "templates.change",
+                "gateways.view",
+                "communication_logs.view",
+            ],
+        },
+        "organisation_id": "5f0b9c1e-3c2a-4a8e-9f7e-2b1d2c3e4f5a",
+        "business_unit": "7",
+    },
+    "admin": {
+        "role": {
+            "name": "admin",
+            "is_admin": True,
+            "permissions": [
+                f"{module}.{action}"
+                for module in ("templates", "gateways", "communication_logs", "users")
+                for action in ("view", "add", "change", "delete")
+            ],
+        },
+        "organisation_id": "5f0b9c1e-3c2a-4a8e-9f7e-2b1d2c3e4f5a",
+        "business_unit": "7",
+    },
+}
+
+
+class Command(BaseCommand):
+    """
+    Use this management command to compare the custom claim codecs: size of the encoded claim, and encode and
+    decode latency, for realistic role payloads.
+    """
+
+    help = "Compare the size and encode/decode latency of the custom claim codecs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        for payload_name, custom_claim in ROLE_PAYLOADS.items():
+            for version, codec in CLAIM_CODECS.items():
+                encoded = codec.encode(custom_claim)
+                encode_time = timeit.timeit(
+                    lambda: codec.encode(custom_claim),  # pylint: disable=cell-var-from-loop
+                    number=iterations,
+                )
+                decode_time = timeit.timeit(
+                    lambda: decode_claim(encoded),  # pylint: disable=cell-var-from-loop
+                    number=iterations,
+                )
+                self.stdout.write(
+                    f"{payload_name:<8} codec {version:<5} {len(encoded):>4} bytes | "
+                    f"encode {encode_time / iterations * 1_000_000:6.1f} µs | "
+                    f"decode {decode_time / iterations * 1_000_000:6.1f} µs"
+                )
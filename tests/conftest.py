@@ -5,9 +5,14 @@ Source: https://bit.ly/2OudJ0R
 
 Note: this may be redundant with pytest.ini.
 """
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import django
+import pytest
 from django.conf import settings
 
 # We manually designate which settings we will be using in an environment variable
@@ -22,3 +27,64 @@ def pytest_configure():
     settings.REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
     settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] = {}
     django.setup()
+
+
+class StandInAuthServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the authentication app used by stateless authentication.
+
+    `routes` maps a path to a (status, payload) tuple, and `calls` counts the requests made to every path. Every
+    response is delayed by `delay` seconds.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInAuthHandler)
+        self.routes = {}
+        self.calls = {}
+        self.delay = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+
+class StandInAuthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.calls[self.path] = self.server.calls.get(self.path, 0) + 1
+        time.sleep(self.server.delay)
+        status, payload = self.server.routes.get(self.path, (404, {"detail": "Not found."}))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture
+def auth_server(settings):  # pylint: disable=redefined-outer-name
+    """
+    Runs a stand-in authentication app, and points stateless authentication at it with an empty cache.
+    """
+    # pylint: disable=import-outside-toplevel
+    from utils.stateless import authentication_app_client
+
+    server = StandInAuthServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.API_BASED_AUTHENTICATION = True
+    settings.AUTHENTICATION_APP_URL = server.url
+    settings.AUTHENTICATION_ENDPOINT = "/api/v1/auth/user/"
+    settings.PERMISSIONS_ENDPOINT = "/api/v1/auth/permissions/"
+    authentication_app_client.clear()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    authentication_app_client.clear()
@@ -0,0 +1,59 @@
+import pytest
+from django.core.paginator import EmptyPage
+
+from backend_service.pagination import EstimatedCountPaginator
+from communications.models import Template
+
+
+@pytest.fixture(name="templates")
+def templates_fixture(settings, mocker, django_user_model):
+    # Every count is an estimate, and none is cached
+    settings.PAGINATION_EXACT_COUNT_THRESHOLD = 0
+    mocker.patch.object(EstimatedCountPaginator, "get_cache_key", return_value=None)
+    user = django_user_model.objects.create(username="user")
+    Template.objects.bulk_create(
+        Template(name=f"Template {index:02}", content="Content", created_by=user) for index in range(25)
+    )
+    return Template.objects.order_by("name")
+
+
+def estimate(mocker, count):
+    mocker.patch.object(EstimatedCountPaginator, "get_estimated_count", return_value=count)
+
+
+@pytest.mark.django_db
+def test_high_estimate_is_corrected_on_a_short_page(templates, mocker):
+    estimate(mocker, 40)
+    paginator = EstimatedCountPaginator(templates, 10)
+
+    page = paginator.page(3)
+
+    assert len(page) == 5
+    assert not page.has_next()
+    assert paginator.count == 25
+    assert paginator.count_is_exact
+
+
+@pytest.mark.django_db
+def test_low_estimate_links_past_its_last_page(templates, mocker):
+    estimate(mocker, 10)
+    paginator = EstimatedCountPaginator(templates, 5)
+
+    page = paginator.page(2)
+
+    assert page.has_next()
+    assert paginator.count == 25
+    assert paginator.count_is_exact
+
+
+@pytest.mark.django_db
+def test_low_estimate_serves_the_pages_past_it(templates, mocker):
+    estimate(mocker, 10)
+    paginator = EstimatedCountPaginator(templates, 5)
+
+    page = paginator.page(5)
+
+    assert [template.name for template in page] == [f"Template {index}" for index in range(20, 25)]
+    assert not page.has_next()
+    with pytest.raises(EmptyPage):
+        paginator.page(6)
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from utils.http import CachedJSONClient, CircuitBreaker, CircuitOpenError
+
+PATH = "/api/v1/auth/user/"
+
+
+@pytest.fixture(name="client")
+def client_fixture(settings):
+    settings.HTTP_CIRCUIT_BREAKER_THRESHOLD = 2
+    settings.HTTP_CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+    return CachedJSONClient(timeout=0.2, stale_timeout=60, request_timeout=2)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.allow()
+
+    def test_half_open_lets_a_single_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        time.sleep(0.06)
+        assert breaker.allow()
+        # The trial is in progress, other calls still fail fast
+        assert not breaker.allow()
+
+    def test_half_open_trial_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.allow()
+        assert breaker.allow()
+
+    def test_half_open_trial_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+
+class TestCachedJSONClient:
+    def test_caches_payload(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+
+        assert client.get(f"{auth_server.url}{PATH}") == {"id": 1}
+        assert client.get(f"{auth_server.url}{PATH}") == {"id": 1}
+        assert auth_server.calls[PATH] == 1
+
+    def test_refetches_expired_payload(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+        client.get(f"{auth_server.url}{PATH}")
+        time.sleep(0.25)
+
+        auth_server.routes[PATH] = (200, {"id": 2})
+        assert client.get(f"{auth_server.url}{PATH}") == {"id": 2}
+        assert auth_server.calls[PATH] == 2
+
+    def test_single_flight(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+        auth_server.delay = 0.2
+        results = []
+
+        def fetch():
+            results.append(client.get(f"{auth_server.url}{PATH}"))
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [{"id": 1}] * 5
+        assert auth_server.calls[PATH] == 1
+
+    def test_serves_stale_payload_on_server_error(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+        client.get(f"{auth_server.url}{PATH}")
+        time.sleep(0.25)
+
+        auth_server.routes[PATH] = (503, {"detail": "Unavailable"})
+        assert client.get(f"{auth_server.url}{PATH}") == {"id": 1}
+
+    def test_doesnt_serve_stale_payload_on_client_error(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+        client.get(f"{auth_server.url}{PATH}")
+        time.sleep(0.25)
+
+        auth_server.routes[PATH] = (401, {"detail": "Unauthorized"})
+        with pytest.raises(requests.HTTPError):
+            client.get(f"{auth_server.url}{PATH}")
+
+    def test_circuit_opens_on_server_errors(self, auth_server, client):
+        auth_server.routes[PATH] = (500, {"detail": "Error"})
+
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                client.get(f"{auth_server.url}{PATH}")
+        with pytest.raises(CircuitOpenError):
+            client.get(f"{auth_server.url}{PATH}")
+        assert auth_server.calls[PATH] == 2
+
+    def test_client_errors_dont_open_circuit(self, auth_server, client):
+        auth_server.routes[PATH] = (404, {"detail": "Not found."})
+
+        for _ in range(3):
+            with pytest.raises(requests.HTTPError):
+                client.get(f"{auth_server.url}{PATH}")
+        assert auth_server.calls[PATH] == 3
+
+    def test_serves_stale_payload_while_circuit_is_open(self, auth_server, client):
+        auth_server.routes[PATH] = (200, {"id": 1})
+        client.get(f"{auth_server.url}{PATH}")
+        time.sleep(0.25)
+
+        auth_server.routes[PATH] = (500, {"detail": "Error"})
+        for _ in range(3):
+            assert client.get(f"{auth_server.url}{PATH}") == {"id": 1}
+        # The circuit opened after two failures, the third call didn't reach the server
+        assert auth_server.calls[PATH] == 3
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIRequestFactory
+
+from communications.models import Template
+from utils.querysets import get_queryset_plan
+from utils.viewsets import ReadOnlyModelViewSet
+
+User = get_user_model()
+
+
+class UserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ("id", "username")
+
+
+class TemplateSerializer(serializers.ModelSerializer):
+    created_by = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Template
+        fields = ("uuid", "name", "created_by")
+
+
+class TemplateNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Template
+        fields = ("uuid", "name")
+
+
+class UserTemplatesSerializer(serializers.ModelSerializer):
+    created_template_set = TemplateNameSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = User
+        fields = ("id", "username", "created_template_set")
+
+
+class PlannedViewSet(ReadOnlyModelViewSet):
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    pagination_class = None
+    conditional_get = False
+
+
+class TemplateViewSet(PlannedViewSet):
+    queryset = Template.objects.all()
+    serializer_class = TemplateSerializer
+
+
+class UserTemplatesViewSet(PlannedViewSet):
+    queryset = User.objects.all()
+    serializer_class = UserTemplatesSerializer
+
+
+@pytest.fixture(name="templates")
+def templates_fixture(django_user_model):
+    return [
+        Template.objects.create(
+            name=f"Template {index}",
+            content="Content",
+            created_by=django_user_model.objects.create(username=f"user{index}"),
+        )
+        for index in range(3)
+    ]
+
+
+def test_plan_joins_forward_relations():
+    plan = get_queryset_plan(TemplateSerializer(), Template)
+
+    assert plan.select_related == {"created_by"}
+    assert not plan.prefetch_related
+    assert plan.only == {"uuid", "name", "created_by", "created_by__id", "created_by__username"}
+
+
+def test_plan_prefetches_many_valued_relations():
+    plan = get_queryset_plan(UserTemplatesSerializer(), User)
+
+    assert plan.select_related == set()
+    assert set(plan.prefetch_related) == {"created_template_set"}
+    assert plan.prefetch_related["created_template_set"].only == {"uuid", "name", "created_by_id"}
+
+
+@pytest.mark.django_db
+def test_list_joins_forward_relations(templates, django_assert_num_queries):
+    view = TemplateViewSet.as_view({"get": "list"})
+
+    with django_assert_num_queries(1):
+        response = view(APIRequestFactory().get("/templates/"))
+
+    assert response.status_code == 200
+    data = json.loads(response.content)["data"]
+    assert {item["created_by"]["username"] for item in data} == {"user0", "user1", "user2"}
+
+
+@pytest.mark.django_db
+def test_retrieve_joins_forward_relations(templates, django_assert_num_queries):
+    view = TemplateViewSet.as_view({"get": "retrieve"})
+    template = templates[0]
+
+    with django_assert_num_queries(1):
+        response = view(APIRequestFactory().get(f"/templates/{template.pk}/"), pk=template.pk)
+
+    assert response.status_code == 200
+    assert json.loads(response.content)["data"]["created_by"]["username"] == "user0"
+
+
+@pytest.mark.django_db
+def test_list_prefetches_many_valued_relations(templates, django_assert_num_queries):
+    view = UserTemplatesViewSet.as_view({"get": "list"})
+
+    # The users, then the templates of all of them
+    with django_assert_num_queries(2):
+        response = view(APIRequestFactory().get("/users/"))
+
+    assert response.status_code == 200
+    data = json.loads(response.content)["data"]
+    assert sorted(len(item["created_template_set"]) for item in data) == [1, 1, 1]
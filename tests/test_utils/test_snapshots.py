@@ -0,0 +1,107 @@
+import os
+import stat
+
+import pytest
+
+from utils.snapshots import Snapshot, SnapshotStore
+
+
+class CountingBuild:
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.data
+
+
+@pytest.fixture(name="snapshot_dir")
+def snapshot_dir_fixture(settings, tmp_path):
+    settings.SNAPSHOT_DIR = str(tmp_path / "snapshots")
+    settings.SNAPSHOT_MAX_AGE = 300
+    settings.SNAPSHOT_CHECK_INTERVAL = 0
+    return settings.SNAPSHOT_DIR
+
+
+def test_builds_once_and_serves_values(snapshot_dir):
+    build = CountingBuild({"a": {"name": "A"}, "type:email": ["a"]})
+    store = SnapshotStore("test", build)
+
+    assert store.get("a") == {"name": "A"}
+    assert store.get("type:email") == ["a"]
+    assert store.get("missing", "default") == "default"
+    assert build.calls == 1
+
+
+def test_values_are_copies(snapshot_dir):
+    store = SnapshotStore("test", CountingBuild({"a": {"name": "A"}}))
+
+    store.get("a")["name"] = "Changed"
+
+    assert store.get("a") == {"name": "A"}
+
+
+def test_files_are_private(snapshot_dir):
+    store = SnapshotStore("test", CountingBuild({"a": 1}))
+    store.get("a")
+
+    assert stat.S_IMODE(os.stat(snapshot_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+
+
+def test_refuses_a_directory_accessible_to_others(snapshot_dir):
+    os.makedirs(snapshot_dir, mode=0o755)
+    os.chmod(snapshot_dir, 0o755)
+    build = CountingBuild({"a": 1})
+    store = SnapshotStore("test", build)
+
+    assert store.get("a", "default") == "default"
+    assert build.calls == 0
+
+
+def test_refuses_a_file_which_isnt_a_snapshot(snapshot_dir):
+    store = SnapshotStore("test", CountingBuild({"a": 1}))
+    os.makedirs(snapshot_dir, mode=0o700)
+    with open(store.path, "wb") as file:
+        file.write(b"\0" * 64)
+
+    assert store.get("a", "default") == "default"
+
+
+def test_picks_up_a_swapped_snapshot(snapshot_dir):
+    reader = SnapshotStore("test", CountingBuild({"a": 1}))
+    assert reader.get("a") == 1
+
+    # Another worker rebuilds the snapshot
+    Snapshot.write(reader.path, 2, (), {"a": 2})
+
+    assert reader.get("a") == 2
+    assert reader.get_snapshot().version == 2
+
+
+def test_rebuilds_an_expired_snapshot(snapshot_dir):
+    build = CountingBuild({"a": 1})
+    store = SnapshotStore("test", build, max_age=0)
+    assert store.get("a") == 1
+
+    build.data = {"a": 2}
+
+    assert store.get("a") == 2
+    assert build.calls == 2
+
+
+def test_rebuilds_on_a_new_generation(snapshot_dir, mocker):
+    build = CountingBuild({"a": 1})
+    store = SnapshotStore("test", build)
+    get_generations = mocker.patch.object(store, "_get_generations", return_value=(1,))
+    assert store.get("a") == 1
+    assert store.get("a") == 1
+    assert build.calls == 1
+
+    build.data = {"a": 2}
+    get_generations.return_value = (2,)
+
+    assert store.get("a") == 2
+    assert store.get_snapshot().generations == (2,)
+    assert build.calls == 2
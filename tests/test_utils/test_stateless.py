@@ -0,0 +1,52 @@
+import pytest
+import requests
+
+from utils.stateless import CustomAuthenticationBackend, CustomTokenUser
+
+USER_PATH = "/api/v1/auth/user/"
+PERMISSIONS_PATH = "/api/v1/auth/permissions/"
+
+
+@pytest.fixture(name="backend")
+def backend_fixture(settings):
+    if hasattr(settings, "USERNAME"):
+        del settings.USERNAME
+    return CustomAuthenticationBackend()
+
+
+def test_permissions_are_fetched_once(auth_server):
+    auth_server.routes[PERMISSIONS_PATH] = (200, {"templates": ["view"]})
+    user = CustomTokenUser({})
+
+    assert user.user_permissions == {"templates": ["view"]}
+    assert CustomTokenUser({}).user_permissions == {"templates": ["view"]}
+    assert auth_server.calls[PERMISSIONS_PATH] == 1
+
+
+def test_permissions_raise_when_app_fails_without_cache(auth_server):
+    auth_server.routes[PERMISSIONS_PATH] = (500, {"detail": "Error"})
+
+    with pytest.raises(requests.HTTPError):
+        CustomTokenUser({}).user_permissions  # pylint: disable=expression-not-assigned
+
+
+def test_authenticate_returns_none_when_app_fails(auth_server, backend):
+    auth_server.routes[USER_PATH] = (503, {"detail": "Unavailable"})
+
+    assert backend.authenticate(None, username="user", password="password") is None
+
+
+@pytest.mark.django_db
+def test_authenticate_updates_only_changed_fields(auth_server, backend, django_user_model):
+    user = django_user_model.objects.create(username="user", first_name="First")
+    auth_server.routes[USER_PATH] = (
+        200,
+        {"id": user.pk, "username": "user", "first_name": "Changed"},
+    )
+
+    authenticated = backend.authenticate(None, username="user", password="password")
+
+    assert authenticated.pk == user.pk
+    user.refresh_from_db()
+    assert user.first_name == "Changed"
+    assert auth_server.calls[USER_PATH] == 1
@@ -0,0 +1,67 @@
+import pytest
+from django.conf import settings
+
+from utils.cache import get_or_compute
+from utils.users import (
+    USER_ACTIVE_CACHE_KEY,
+    get_cached_user,
+    get_user_generation,
+    invalidate_cached_user,
+    is_user_active,
+    system_user,
+)
+
+
+@pytest.fixture(name="user")
+def user_fixture(django_user_model, mocker, django_capture_on_commit_callbacks):
+    # The default user model has no uuid, cache users by their primary key
+    mocker.patch("utils.users.api_settings.USER_ID_FIELD", "id")
+    with django_capture_on_commit_callbacks(execute=True):
+        user = django_user_model.objects.create(username="user", first_name="First")
+    # Start afresh, whatever earlier runs left in Redis
+    invalidate_cached_user(user.pk)
+    return user
+
+
+@pytest.mark.django_db
+def test_system_user_is_created(django_user_model):
+    user = system_user("test_job_user")
+
+    assert not user.is_active
+    assert django_user_model.objects.filter(username="test_job_user").exists()
+
+
+@pytest.mark.django_db
+def test_saving_a_user_invalidates_its_cached_copy(user, django_capture_on_commit_callbacks):
+    assert get_cached_user(user.pk).first_name == "First"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.first_name = "Changed"
+        user.save()
+
+    assert get_cached_user(user.pk).first_name == "Changed"
+
+
+@pytest.mark.django_db
+def test_cached_copies_dont_include_the_password(user):
+    cached = get_cached_user(user.pk)
+
+    assert "password" in cached.get_deferred_fields()
+
+
+@pytest.mark.django_db
+def test_lookup_finishing_after_an_invalidation_isnt_served(user, django_user_model):
+    assert is_user_active(user.pk)
+    generation = get_user_generation(user.pk)
+    django_user_model.objects.filter(pk=user.pk).update(is_active=False)
+
+    invalidate_cached_user(user.pk)
+    # A lookup which read the user before it was deactivated writes it back late
+    get_or_compute(
+        USER_ACTIVE_CACHE_KEY.format(user.pk, generation),
+        lambda: True,
+        settings.USER_CACHE_TIMEOUT,
+        version=settings.USER_CACHE_VERSION,
+    )
+
+    assert not is_user_active(user.pk)
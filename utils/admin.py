@@ -6,11 +6,14 @@ from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.admin.utils import lookup_field
 from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
 from django.http import FileResponse, HttpResponse, HttpResponseRedirect
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from utils.cache import bump_model_generation
 from utils.file import file_size
+from utils.models import soft_delete
 from utils.serializers import CSVFileOrEmailModelMixin, CSVTooLarge
 
 
@@ -134,27 +137,7 @@ class CustomModelAdmin(AutoCompleteMixin, admin.ModelAdmin):
             request: Current HTTP request.
             queryset: The selected rows in the Django admin.
         """
-        queryset = queryset.filter(deleted_by=None)
-        count = queryset.count()
-
-        # Base update fields
-        update_fields = {
-            "deleted_at": timezone.now(),
-            "updated_at": timezone.now(),
-        }
-
-        if hasattr(queryset.model, "is_active"):
-            update_fields["is_active"] = False
-
-        # If any object in the queryset has the attribute, the model has the field
-        sample_obj = queryset.first()
-        if sample_obj:
-            if hasattr(sample_obj, "deleted_by"):
-                update_fields["deleted_by"] = request.user
-            if hasattr(sample_obj, "updated_by"):
-                update_fields["updated_by"] = request.user
-
-        queryset.update(**update_fields)
+        count = soft_delete(queryset.filter(deleted_by=None), request.user)
 
         if count:
             self.message_user(
@@ -196,6 +179,8 @@ class CustomModelAdmin(AutoCompleteMixin, admin.ModelAdmin):
                 update_fields["updated_by"] = request.user
 
         queryset.update(**update_fields)
+        model = queryset.model
+        transaction.on_commit(lambda: bump_model_generation(model))
 
         if count:
             self.message_user(
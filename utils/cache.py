@@ -0,0 +1,320 @@
+import functools
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from utils import logger
+
+# Sentinel returned on a cache miss, so that falsy values such as None can be cached too
+MISSING = object()
+
+
+class LocalCache:
+    """
+    Thread-safe, bounded in-process LRU cache with a per-entry expiry and hit/miss counters.
+
+    It is meant to sit in front of Redis for small, hot values. Every worker process has its own copy, so entries
+    can be stale for at most their timeout after they change elsewhere.
+
+    Attributes:
+        maxsize (int): Maximum number of entries; the least recently used entry is evicted beyond it.
+        timeout (float): Default number of seconds an entry is kept for.
+    """
+
+    def __init__(self, maxsize=1024, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """
+        Returns the value of `key`, or `default` if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, timeout=None):
+        """
+        Stores `value` for `timeout` seconds (defaults to `self.timeout`).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters, and the current number of entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+MODEL_GENERATION_KEY = "model_generation:{}"
+# Generation of the rows of a model which belong to a tenant, and of the rows of all tenants
+TENANT_GENERATION_KEY = "model_generation:{}:{}"
+ALL_TENANTS = "all"
+# Generations bumped by the current process, so that its in-process caches see its own writes at once
+local_generations = Counter()
+
+
+def get_model_generation(model) -> int:
+    """
+    Returns the generation of a model, a counter bumped on every write of its rows (see `utils.signals`).
+    Put it in the key of anything cached from the model's table, so that writes invalidate it without having to
+    find and delete the keys.
+
+    Returns:
+        int: The generation, or None if Redis is unavailable, in which case nothing should be cached.
+    """
+    try:
+        return cache.get_or_set(
+            MODEL_GENERATION_KEY.format(model._meta.label_lower), 0, timeout=None
+        )
+    except RedisError as e:
+        logger.error("Generation of %s is unknown as Redis is unavailable: %s", model, e)
+        return None
+
+
+def get_tenant_generation(model, tenant):
+    """
+    Returns the generation of the rows of a model visible to a tenant: a pair of the counter of the tenant, bumped
+    by writes of its rows, and of the counter of all tenants, bumped by writes whose tenant isn't known.
+
+    Returns:
+        tuple: The generation, or None if Redis is unavailable, in which case nothing should be cached.
+    """
+    label = model._meta.label_lower
+    keys = [
+        TENANT_GENERATION_KEY.format(label, tenant),
+        TENANT_GENERATION_KEY.format(label, ALL_TENANTS),
+    ]
+    try:
+        generations = cache.get_many(keys)
+    except RedisError as e:
+        logger.error("Generation of %s is unknown as Redis is unavailable: %s", model, e)
+        return None
+    return tuple(generations.get(key, 0) for key in keys)
+
+
+def bump_model_generation(model, tenant=None):
+    """
+    Invalidates everything cached under the current generation of a model, and under the generation of the
+    given tenant, or of all tenants if it isn't given.
+    """
+    label = model._meta.label_lower
+    local_generations[label] += 1
+    for key in (
+        MODEL_GENERATION_KEY.format(label),
+        TENANT_GENERATION_KEY.format(label, tenant or ALL_TENANTS),
+    ):
+        try:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+        except (RedisError, ValueError) as e:
+            logger.error("Generation of %s could not be bumped: %s", model, e)
+
+
+# What `get_or_compute` stores: the value, the number of seconds it took to compute, and when it goes stale (as
+# a Unix timestamp). Entries are kept in Redis for `stale_timeout` more seconds, to be served while recomputing.
+CacheEntry = namedtuple("CacheEntry", ["value", "delta", "expiry"])
+# Stored instead of the value when the computation raised one of the `negative` exceptions
+NegativeEntry = namedtuple("NegativeEntry", ["exception_class", "args"])
+# How `get_or_compute` serves stale values, caches exceptions and expires early; the settings apply to what is None
+CachePolicy = namedtuple(
+    "CachePolicy",
+    ["stale_timeout", "negative", "negative_timeout", "beta"],
+    defaults=[None, (), None, None],
+)
+
+COMPUTE_LOCK_KEY = "compute_lock:{}"
+# Seconds between two reads of the key while another process computes it
+COMPUTE_POLL_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, timeout, *, version=None, policy=None):
+    """
+    Read-through cache lookup which protects `compute` from stampedes when a hot key expires.
+
+    - Single flight: the process which gets the lock of the key (`cache.add`) computes it, the others keep
+      serving the stale value meanwhile. On a cold miss they wait for it up to `settings.CACHE_LOCK_WAIT`
+      seconds, then compute it themselves.
+    - Probabilistic early expiration (XFetch): every read recomputes the value a little before it goes stale,
+      with a probability growing as the expiry gets closer and the computation is longer. A `beta` > 1 favours
+      earlier refreshes.
+    - Negative caching: if `compute` raises one of the `negative` exceptions of the policy, e.g.
+      `Model.DoesNotExist`, it is cached for `negative_timeout` seconds and raised again on every read of the key.
+    - Redis being unavailable calls `compute` directly.
+
+    Args:
+        key (str): The cache key.
+        compute (callable): Computes the value, without arguments.
+        timeout (int): Number of seconds the value is fresh for.
+        version (int): Version of the key, as in Django's cache API.
+        policy (CachePolicy): The tuning of the lookup:
+            - stale_timeout (int): Number of seconds a stale value can be served while it is recomputed,
+              defaults to `settings.CACHE_STALE_TIMEOUT`.
+            - negative (tuple): Exceptions of `compute` to cache.
+            - negative_timeout (int): Number of seconds exceptions are cached for, defaults to
+              `settings.CACHE_NEGATIVE_TIMEOUT`.
+            - beta (float): Eagerness of the early expiration, defaults to `settings.CACHE_XFETCH_BETA`.
+
+    Returns:
+        The cached or computed value.
+    """
+    policy = policy or CachePolicy()
+    stale_timeout = settings.CACHE_STALE_TIMEOUT if policy.stale_timeout is None else policy.stale_timeout
+    beta = settings.CACHE_XFETCH_BETA if policy.beta is None else policy.beta
+    try:
+        entry = cache.get(key, version=version)
+    except RedisError as e:
+        logger.error("Cache is skipped as Redis is unavailable: %s", e)
+        return compute()
+    if not isinstance(entry, CacheEntry):
+        # Missing, or stored by something else than this function
+        entry = None
+
+    if entry is not None and not _should_recompute(entry, beta):
+        return _unwrap(entry)
+
+    lock_key = COMPUTE_LOCK_KEY.format(key)
+    token = uuid.uuid4().hex
+    try:
+        locked = cache.add(lock_key, token, timeout=settings.CACHE_LOCK_TIMEOUT, version=version)
+    except RedisError as e:
+        logger.error("Cache lock is skipped as Redis is unavailable: %s", e)
+        locked = False
+
+    if not locked:
+        if entry is not None:
+            # Someone else is recomputing it, the stale value will do meanwhile
+            return _unwrap(entry)
+        entry = _wait_for_entry(key, version)
+        if entry is not None:
+            return _unwrap(entry)
+
+    try:
+        entry, entry_timeout = _compute_entry(compute, timeout, policy.negative, policy.negative_timeout)
+        try:
+            cache.set(key, entry, timeout=entry_timeout + stale_timeout, version=version)
+        except RedisError as e:
+            logger.error("Value could not be cached as Redis is unavailable: %s", e)
+    finally:
+        if locked:
+            _release_lock(lock_key, token, version)
+    return _unwrap(entry)
+
+
+def cached_computation(key, timeout, **options):
+    """
+    Decorator caching the return value of a function with `get_or_compute`.
+
+    Args:
+        key (str or callable): A format string, e.g. "gateway:{}", formatted with the arguments of the function,
+            or a callable taking them and returning the key.
+        timeout (int): Number of seconds the value is fresh for.
+        options: The keyword arguments of `get_or_compute`, i.e. `version` and `policy`.
+
+    The decorated function gets an `invalidate(*args, **kwargs)` attribute which deletes the cached value.
+    """
+
+    def decorator(func):
+        def make_key(*args, **kwargs):
+            return key(*args, **kwargs) if callable(key) else key.format(*args, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_or_compute(
+                make_key(*args, **kwargs),
+                lambda: func(*args, **kwargs),
+                timeout,
+                **options,
+            )
+
+        def invalidate(*args, **kwargs):
+            try:
+                cache.delete(make_key(*args, **kwargs), version=options.get("version"))
+            except RedisError as e:
+                logger.error("Cached value could not be invalidated: %s", e)
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
+
+
+def _should_recompute(entry, beta):
+    # XFetch: recompute early when now - delta * beta * log(rand()) passes the expiry. log(rand()) is negative,
+    # and rarely large, so most reads return the cached value until the very end of its life.
+    return time.time() - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expiry  # nosec B311
+
+
+def _compute_entry(compute, timeout, negative, negative_timeout):
+    start = time.monotonic()
+    try:
+        value = compute()
+    except negative as exc:
+        negative_timeout = (
+            settings.CACHE_NEGATIVE_TIMEOUT if negative_timeout is None else negative_timeout
+        )
+        # Raising is cheap, so negative entries don't expire early
+        entry = CacheEntry(NegativeEntry(type(exc), exc.args), 0, time.time() + negative_timeout)
+        return entry, negative_timeout
+    delta = time.monotonic() - start
+    return CacheEntry(value, delta, time.time() + timeout), timeout
+
+
+def _unwrap(entry):
+    if isinstance(entry.value, NegativeEntry):
+        raise entry.value.exception_class(*entry.value.args)
+    return entry.value
+
+
+def _wait_for_entry(key, version):
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COMPUTE_POLL_INTERVAL)
+        try:
+            entry = cache.get(key, version=version)
+        except RedisError:
+            return None
+        if isinstance(entry, CacheEntry):
+            return entry
+    return None
+
+
+def _release_lock(lock_key, token, version):
+    try:
+        # Only release our own lock, not the one of a process which took over after ours timed out
+        if cache.get(lock_key, version=version) == token:
+            cache.delete(lock_key, version=version)
+    except RedisError as e:
+        logger.error("Cache lock could not be released: %s", e)
@@ -0,0 +1,207 @@
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from utils import logger
+from utils.cache import MISSING, LocalCache
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of making a call while the circuit breaker of its host is open.
+    """
+
+
+@lru_cache(maxsize=None)
+def get_http_session() -> requests.Session:
+    """
+    Return a process wide `requests.Session`, which keeps connections alive in a pool per host.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while, so that requests fail fast instead of piling up on timeouts.
+
+    The circuit opens after `failure_threshold` consecutive failures. Once `reset_timeout` seconds have passed, a
+    single trial call is let through: the circuit closes if it succeeds, and opens again if it fails.
+
+    Attributes:
+        failure_threshold (int): Number of consecutive failures opening the circuit.
+        reset_timeout (float): Number of seconds the circuit stays open before a trial call.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_progress or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class _Call:
+    """
+    An HTTP call in flight, which concurrent callers of the same URL wait for instead of making their own.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CachedJSONClient:
+    """
+    Fetches JSON payloads over the shared session, caching successful responses for `timeout` seconds.
+
+    - Concurrent misses of the same URL make a single call, the other threads wait for its result.
+    - Every host has a circuit breaker; calls fail fast with `CircuitOpenError` while it is open.
+    - When a call fails with a connection error, a server error or an open circuit, the last payload is served if
+      it is at most `stale_timeout` seconds past its expiry. Client errors (4xx) are never served from stale data.
+
+    Responses are cached per URL, so only use it for calls whose response doesn't depend on anything else.
+
+    Attributes:
+        timeout (float): Number of seconds a payload is served from the cache.
+        stale_timeout (float): Number of seconds an expired payload can still be served if the call fails.
+        request_timeout (float): Timeout of the HTTP calls.
+    """
+
+    def __init__(self, timeout, stale_timeout, request_timeout, maxsize=1024):
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.request_timeout = request_timeout
+        # Entries are (payload, expires_at), and kept until they are too old to be served as stale data
+        self.cache = LocalCache(maxsize=maxsize, timeout=timeout + stale_timeout)
+        self._breakers = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """
+        Returns the JSON payload of a GET of `url`.
+
+        Raises:
+            requests.HTTPError: If the response has an error status, and no stale payload can be served for it.
+            requests.RequestException: If the call failed, and no stale payload can be served.
+            CircuitOpenError: If the circuit breaker of the host is open, and no stale payload can be served.
+        """
+        entry = self.cache.get(url)
+        if entry is not MISSING and entry[1] > time.monotonic():
+            return entry[0]
+
+        try:
+            return self._single_flight(url)
+        except (requests.RequestException, CircuitOpenError) as e:
+            if entry is MISSING or not _is_server_failure(e):
+                raise
+            logger.warning("Serving a stale response of %s as the call failed: %s", url, e)
+            return entry[0]
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self._breakers.clear()
+
+    def _single_flight(self, url):
+        with self._lock:
+            call = self._calls.get(url)
+            leader = call is None
+            if leader:
+                call = self._calls[url] = _Call()
+
+        if not leader:
+            call.done.wait(self.request_timeout)
+            if not call.done.is_set():
+                raise requests.Timeout(f"Timed out waiting for a concurrent call of {url}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._fetch(url)
+            self.cache.set(url, (call.result, time.monotonic() + self.timeout))
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[url]
+            call.done.set()
+
+    def _fetch(self, url):
+        breaker = self._get_breaker(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker of {url} is open")
+
+        try:
+            response = get_http_session().get(url, timeout=self.request_timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if _is_server_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return response.json()
+
+    def _get_breaker(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(
+                    failure_threshold=settings.HTTP_CIRCUIT_BREAKER_THRESHOLD,
+                    reset_timeout=settings.HTTP_CIRCUIT_BREAKER_RESET_TIMEOUT,
+                )
+            return breaker
+
+
+def _is_server_failure(error) -> bool:
+    """
+    Whether an error means the remote service is unhealthy, as opposed to it rejecting the request.
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    return True
@@ -0,0 +1,97 @@
+import bisect
+import ipaddress
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from utils import logger
+
+WILDCARD = "*"
+
+# Settings holding allow list entries, or affecting how the allow lists are built
+IP_ALLOW_LIST_SETTINGS = (
+    "WHITELISTED_IP_ADDRESSES",
+    "WHITELISTED_CIDR",
+    "THROTTLE_TRUSTED_IP_ADDRESSES",
+    "IP_ALLOW_LIST_CACHE_SIZE",
+)
+
+
+class IPAllowList:
+    """
+    Precompiled matcher for a list of IP addresses and CIDR blocks, covering both IPv4 and IPv6.
+
+    Exact addresses are treated as /32 (or /128) networks. All the entries are merged into sorted, non-overlapping
+    integer intervals per IP version once, so a lookup is a single binary search, O(log n) in the number of
+    entries, without building any ipaddress objects for the entries. Recent decisions are kept in a bounded LRU.
+    A `*` entry allows every address.
+    """
+
+    def __init__(self, entries, cache_size=1024):
+        self.allow_all = WILDCARD in entries
+        self._starts = {4: [], 6: []}
+        self._ends = {4: [], 6: []}
+
+        ranges = {4: [], 6: []}
+        for entry in entries:
+            if entry == WILDCARD:
+                continue
+            try:
+                network = ipaddress.ip_network(entry.strip(), strict=False)
+            except ValueError:
+                logger.error("Ignoring invalid IP address or CIDR in allow list: %s", entry)
+                continue
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        for version, intervals in ranges.items():
+            for start, end in sorted(intervals):
+                # Merge overlapping and adjacent intervals
+                if self._ends[version] and start <= self._ends[version][-1] + 1:
+                    self._ends[version][-1] = max(self._ends[version][-1], end)
+                else:
+                    self._starts[version].append(start)
+                    self._ends[version].append(end)
+
+        self.contains = lru_cache(maxsize=cache_size)(self._contains)
+
+    def __contains__(self, ip_address):
+        return self.contains(ip_address)
+
+    def _contains(self, ip_address):
+        if self.allow_all:
+            return True
+
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except (AttributeError, ValueError):
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        value = int(address)
+        index = bisect.bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+
+
+@lru_cache(maxsize=None)
+def get_ip_allow_list(*setting_names) -> IPAllowList:
+    """
+    Returns the compiled allow list made of the entries of the given settings, e.g.
+    `get_ip_allow_list("WHITELISTED_IP_ADDRESSES", "WHITELISTED_CIDR")`.
+
+    The allow list is compiled on first use and reused afterwards; it is rebuilt when one of the settings changes.
+    """
+    entries = []
+    for setting_name in setting_names:
+        entries.extend(getattr(settings, setting_name, None) or [])
+    return IPAllowList(entries, cache_size=settings.IP_ALLOW_LIST_CACHE_SIZE)
+
+
+@receiver(setting_changed)
+def reload_ip_allow_lists(setting, **kwargs):
+    if setting in IP_ALLOW_LIST_SETTINGS:
+        get_ip_allow_list.cache_clear()
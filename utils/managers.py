@@ -0,0 +1,146 @@
+import hashlib
+import pickle  # nosec B403: only unpickles the querysets this service cached
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models
+from redis.exceptions import RedisError
+
+from utils import logger
+from utils.cache import MISSING, MODEL_GENERATION_KEY, LocalCache, local_generations
+
+QUERYSET_CACHE_KEY = "queryset:{}"
+
+# First tier of the queryset cache, in front of Redis. It holds pickles, so that every hit gets its own instances.
+local_queryset_cache = LocalCache(
+    maxsize=settings.QUERYSET_CACHE_LOCAL_MAX_SIZE,
+    timeout=settings.QUERYSET_CACHE_LOCAL_TIMEOUT,
+)
+
+
+@lru_cache(maxsize=None)
+def get_models_by_table() -> dict:
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+class CachedQuerySet(models.QuerySet):
+    """
+    QuerySet whose evaluated results are cached, in-process and in Redis, keyed by the SQL of the query and its
+    parameters. Meant for small lookups run over and over again, e.g. `Gateway.cached.get(type=...)`.
+
+    - Entries are stored with the generations (see `utils.cache`) of every table the query reads, joins
+      included, and are discarded as soon as one of them is bumped, i.e. a row of the table is written.
+      Tables read by subqueries aren't tracked, so don't filter cached querysets with other querysets.
+    - Only evaluating the queryset is cached (iterating it, `get`, `first`, `list`, ...); `count`, `exists`,
+      `iterator`, aggregates and writes still query the database.
+    - Querysets evaluated inside a transaction, locking rows or prefetching relations aren't cached, and neither
+      are results pickling to more than `settings.QUERYSET_CACHE_MAX_BYTES`.
+    - Redis being unavailable falls back to the database.
+    """
+
+    def _fetch_all(self):
+        if self._result_cache is not None:
+            return super()._fetch_all()
+
+        key = self.get_cache_key()
+        if key is None:
+            return super()._fetch_all()
+
+        cache_key, labels = key
+        local_key = (cache_key, tuple(local_generations[label] for label in labels))
+        payload = local_queryset_cache.get(local_key)
+        if payload is MISSING:
+            payload, generations = self._get_cached_payload(cache_key, labels)
+            if payload is None:
+                super()._fetch_all()
+                payload = self._set_cached_payload(cache_key, generations)
+                if payload is not None:
+                    local_queryset_cache.set(local_key, payload)
+                return None
+            local_queryset_cache.set(local_key, payload)
+
+        self._result_cache = pickle.loads(payload)  # nosec B301: pickled by this service
+        return None
+
+    def get_cache_key(self):
+        """
+        Returns the cache key of the results and the labels of the models the query reads, or None if the
+        queryset mustn't be cached.
+        """
+        query = self.query
+        if (
+            self._prefetch_related_lookups
+            or query.select_for_update
+            or query.is_empty()
+            or connections[self.db].in_atomic_block
+        ):
+            return None
+        try:
+            sql, params = query.sql_with_params()
+        except EmptyResultSet:
+            return None
+
+        # values() and values_list() run the same SQL as the instances, but return something else
+        fields = getattr(self, "_fields", None)
+        description = f"{self.db}|{self._iterable_class.__qualname__}|{fields}|{sql}|{params!r}"
+        digest = hashlib.sha256(description.encode("utf-8")).hexdigest()
+        return QUERYSET_CACHE_KEY.format(digest), self._get_labels()
+
+    def _get_labels(self):
+        models_by_table = get_models_by_table()
+        labels = {self.model._meta.label_lower}
+        for alias in self.query.alias_map.values():
+            model = models_by_table.get(alias.table_name)
+            if model is not None:
+                labels.add(model._meta.label_lower)
+        return tuple(sorted(labels))
+
+    @staticmethod
+    def _get_cached_payload(cache_key, labels):
+        """
+        Returns the cached pickle of the results, if it is still current, and the current generations of the
+        models, which are None if Redis is unavailable.
+        """
+        generation_keys = [MODEL_GENERATION_KEY.format(label) for label in labels]
+        try:
+            values = cache.get_many([cache_key, *generation_keys])
+        except RedisError as e:
+            logger.error("Cached queryset is skipped as Redis is unavailable: %s", e)
+            return None, None
+
+        generations = tuple(values.get(key, 0) for key in generation_keys)
+        entry = values.get(cache_key)
+        if entry is None or entry[0] != generations:
+            return None, generations
+        return entry[1], generations
+
+    def _set_cached_payload(self, cache_key, generations):
+        """
+        Caches the results under the generations read before running the query, so that a write committed in
+        between makes them stale right away. Returns their pickle, or None if they weren't cached.
+        """
+        if generations is None:
+            return None
+        payload = pickle.dumps(self._result_cache, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > settings.QUERYSET_CACHE_MAX_BYTES:
+            logger.warning(
+                "Results of %s are too large to be cached: %s bytes", self.model, len(payload)
+            )
+            return None
+        try:
+            cache.set(
+                cache_key, (generations, payload), timeout=settings.QUERYSET_CACHE_TIMEOUT
+            )
+        except RedisError as e:
+            logger.error("Queryset could not be cached as Redis is unavailable: %s", e)
+            return None
+        return payload
+
+
+class CachedManager(models.Manager.from_queryset(CachedQuerySet)):
+    """
+    Manager of `CachedQuerySet`, available as `Model.cached` on every model of the codebase.
+    """
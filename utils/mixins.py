@@ -1,15 +1,44 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework import status
+from redis.exceptions import RedisError
+from rest_framework import serializers, status
 from rest_framework.mixins import CreateModelMixin as DefaultCreateModelMixin
 from rest_framework.mixins import DestroyModelMixin as DefaultDestroyModelMixin
 from rest_framework.mixins import ListModelMixin as DefaultListModelMixin
 from rest_framework.mixins import RetrieveModelMixin as DefaultRetrieveModelMixin
 from rest_framework.mixins import UpdateModelMixin as DefaultUpdateModelMixin
 
+from backend_service.exceptions import ValidationErrorAPIException
 from backend_service.pagination import PageNumberPagination
-from utils.responses import success_response
+from utils import logger
+from utils.cache import (
+    bump_model_generation,
+    get_model_generation,
+    get_tenant_generation,
+)
+from utils.models import soft_delete
+from utils.responses import (
+    error_response,
+    streaming_success_response,
+    success_response,
+)
 
 
 class CSRFExemptMixin:
@@ -34,7 +63,274 @@ class CSRFExemptMixin:
         return super().dispatch(*args, **kwargs)
 
 
-class RetrieveModelMixin(DefaultRetrieveModelMixin):
+class ConditionalGetMixin:
+    """
+    Validators for conditional GET requests: an `ETag` (and a `Last-Modified` for single instances) is computed
+    before serializing, and a 304 is returned without serializing when the client's `If-None-Match` or
+    `If-Modified-Since` matches.
+
+    ETags of instances are derived from their `updated_at`, ETags of lists from the generation of the model, and
+    only models with an `updated_at` field get validators. They also cover the full path, the language and the
+    tenant of the user, and responses are marked private with the headers they vary on, so that shared caches
+    never serve one tenant's data to another.
+    """
+
+    # Set to False to always send full responses
+    conditional_get = True
+    conditional_vary_headers = ("Authorization", "Cookie", "Accept-Language")
+
+    def get_validator_scope(self):
+        """
+        Returns what the response depends on about the user: its organisation, or the user itself.
+
+        :return: A string identifying the tenant.
+        """
+        user = self.request.user
+        return str(
+            getattr(user, "organisation_id", None) or getattr(user, "uuid", None) or ""
+        )
+
+    def make_etag(self, *parts):
+        """
+        Makes a weak ETag out of the given parts, the request path, the language and the tenant.
+
+        :param parts: Values identifying the version of the data.
+
+        :return: The ETag.
+        """
+        values = (
+            self.request.get_full_path(),
+            get_language(),
+            self.get_validator_scope(),
+            *parts,
+        )
+        digest = hashlib.sha256("|".join(str(value) for value in values).encode())
+        return f'W/"{digest.hexdigest()[:32]}"'
+
+    def accepts_conditional_get(self, model):
+        if not self.conditional_get or self.request.method not in ("GET", "HEAD"):
+            return False
+        try:
+            model._meta.get_field("updated_at")
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def get_queryset_etag(self, queryset):
+        """
+        Fingerprints a filtered queryset with the generation of its model (see `utils.cache`), for the tenant of
+        the user when it has an organisation, without querying the database. `utils.signals` bumps it on every
+        write, soft and hard deletes included; the filters are covered by the path of the ETag.
+
+        :param queryset: The filtered queryset.
+
+        :return: The ETag, or None if the queryset doesn't get validators or Redis is unavailable.
+        """
+        model = queryset.model
+        if not self.accepts_conditional_get(model):
+            return None
+        tenant = getattr(self.request.user, "organisation_id", None)
+        if tenant:
+            generation = get_tenant_generation(model, tenant)
+        else:
+            generation = get_model_generation(model)
+        if generation is None:
+            return None
+        return self.make_etag(model._meta.label_lower, generation)
+
+    def get_instance_validators(self, instance):
+        """
+        :param instance: The model instance.
+
+        :return: The ETag and the last modification timestamp of an instance, or (None, None).
+        """
+        if not self.accepts_conditional_get(type(instance)) or instance.updated_at is None:
+            return None, None
+        etag = self.make_etag(
+            instance._meta.label_lower, instance.pk, instance.updated_at.isoformat()
+        )
+        return etag, int(instance.updated_at.timestamp())
+
+    def get_not_modified_response(self, etag, last_modified=None):
+        """
+        :return: A 304 (or 412) response if the request's preconditions say so, None otherwise.
+        """
+        if etag is None:
+            return None
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            self.set_validator_headers(response, etag, last_modified)
+        return response
+
+    def set_validator_headers(self, response, etag, last_modified=None):
+        if etag is None:
+            return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, self.conditional_vary_headers)
+        return response
+
+
+RESPONSE_CACHE_KEY = "response:{}:{}:{}:{}:{}"
+
+
+class ResponseCacheMixin(ConditionalGetMixin):
+    """
+    Caches the rendered bytes of list and retrieve responses in Redis, per user, when `cache_responses` is True.
+    A hit of a list skips the queryset, the database and the serializer altogether; a hit of a retrieve still
+    fetches the instance, so that its object permissions are checked. Authentication, permissions and
+    throttling always run.
+
+    Keys combine the organisation, business unit, id and role of the user, the path, the sorted query
+    parameters, the language, the rendered format, the serializer class and `response_cache_version`, as well as
+    the generation of the model for the organisation. `utils.signals` bumps the generation when a row of the
+    organisation is saved or deleted, and bulk writes bump it for every organisation, so entries are never
+    invalidated one by one. Users without an organisation aren't cached.
+    """
+
+    cache_responses = False
+    response_cache_actions = ("list", "retrieve")
+    response_cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+    # Bump when the representation changes without the serializer class changing, e.g. after a deployment
+    response_cache_version = 1
+
+    def get_response_cache_key(self):
+        """
+        :return: The cache key of the response of the request, or None if it isn't cached.
+        """
+        if (
+            not self.cache_responses
+            or self.action not in self.response_cache_actions
+            or self.request.method != "GET"
+        ):
+            return None
+        user = self.request.user
+        tenant = getattr(user, "organisation_id", None)
+        if not tenant:
+            return None
+
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+        generation = get_tenant_generation(model, tenant)
+        if generation is None:
+            return None
+
+        params = sorted(
+            (key, sorted(values)) for key, values in self.request.query_params.lists()
+        )
+        parts = (
+            self.request.path,
+            params,
+            getattr(user, "business_unit", None),
+            str(getattr(user, "uuid", None) or getattr(user, "pk", None)),
+            getattr(user, "role", None),
+            get_language(),
+            self.request.accepted_media_type,
+            f"{serializer_class.__module__}.{serializer_class.__qualname__}",
+            self.response_cache_version,
+        )
+        digest = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+        return RESPONSE_CACHE_KEY.format(model._meta.label_lower, tenant, *generation, digest)
+
+    def get_cached_response(self):
+        """
+        :return: The cached response of the request, a 304 if it is still fresh for the client, or None on a miss.
+        """
+        self.response_cache_key = self.get_response_cache_key()
+        if self.response_cache_key is None:
+            return None
+        try:
+            entry = cache.get(self.response_cache_key)
+        except RedisError as e:
+            logger.error("Response cache is skipped as Redis is unavailable: %s", e)
+            return None
+        if entry is None:
+            return None
+
+        self.response_cache_key = None
+        content_type, etag, content = entry
+        not_modified = self.get_not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        response = HttpResponse(content, content_type=content_type)
+        return self.set_validator_headers(response, etag)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, "response_cache_key", None)
+        if key is None or response.status_code != 200 or response.streaming:
+            return response
+
+        if not getattr(response, "is_rendered", True):
+            response.render()
+        entry = (response["Content-Type"], response.get("ETag"), response.content)
+        try:
+            cache.set(key, entry, timeout=self.response_cache_timeout)
+        except RedisError as e:
+            logger.error("Response could not be cached as Redis is unavailable: %s", e)
+        return response
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets: `?fields=uuid,name` only returns these fields of the serializer, and `?exclude=content`
+    returns all of them but these. Names are validated against the fields the serializer declares.
+
+    Since the serializer is trimmed, the queryset planner of `utils.viewsets.GenericViewSet` only loads the
+    columns of the remaining fields, e.g. large text columns aren't read at all when they aren't requested.
+    """
+
+    fields_query_param = "fields"
+    exclude_query_param = "exclude"
+    sparse_fieldset_actions = ("list", "retrieve")
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Get serializer method to trim the serializer to the requested fields.
+
+        :return: The serializer.
+        """
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.action in self.sparse_fieldset_actions:
+            self.apply_sparse_fieldset(serializer)
+        return serializer
+
+    def apply_sparse_fieldset(self, serializer):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+
+        fields = self.get_requested_fields(self.fields_query_param)
+        exclude = self.get_requested_fields(self.exclude_query_param)
+        if not fields and not exclude:
+            return
+
+        unknown = (fields | exclude) - set(serializer.fields)
+        if unknown:
+            raise ValidationErrorAPIException(
+                _("Unknown fields: %(fields)s") % {"fields": ", ".join(sorted(unknown))}
+            )
+
+        for name in list(serializer.fields):
+            if (fields and name not in fields) or name in exclude:
+                serializer.fields.pop(name)
+
+    def get_requested_fields(self, query_param):
+        """
+        :param query_param: The name of the query parameter.
+
+        :return: The set of comma separated field names of the query parameter.
+        """
+        value = self.request.query_params.get(query_param, "")
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class RetrieveModelMixin(
+    SparseFieldsetMixin, ResponseCacheMixin, DefaultRetrieveModelMixin
+):
     """
     Retrieve a model instance.
     """
@@ -49,28 +345,70 @@ class RetrieveModelMixin(DefaultRetrieveModelMixin):
 
         :return: The retrieve method.
         """
+        # Before the cache, so that the object permissions are checked on hits too
         instance = self.get_object()
+        cached_response = self.get_cached_response()
+        if cached_response is not None:
+            return cached_response
+
+        etag, last_modified = self.get_instance_validators(instance)
+        not_modified = self.get_not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(instance)
-        return success_response(data=serializer.data)
+        return self.set_validator_headers(
+            success_response(data=serializer.data), etag, last_modified
+        )
 
 
-class ListModelMixin(DefaultListModelMixin):
+class ListModelMixin(SparseFieldsetMixin, ResponseCacheMixin, DefaultListModelMixin):
     """
     List a queryset.
     """
 
+    # Viewsets of large tables can opt into `backend_service.pagination.KeysetPagination`, whose cost doesn't
+    # grow with the page number
     pagination_class = PageNumberPagination
+    # Unpaginated listings are streamed when True: the queryset is read with a server-side cursor and serialized
+    # `stream_chunk_size` rows at a time, so memory doesn't grow with the number of rows
+    stream_list = False
+    stream_chunk_size = 500
 
     def list(self, request, *args, **kwargs):
+        cached_response = self.get_cached_response()
+        if cached_response is not None:
+            return cached_response
+
         queryset = self.filter_queryset(self.get_queryset())
+        etag = self.get_queryset_etag(queryset)
+        not_modified = self.get_not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
 
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            response = self.get_paginated_response(serializer.data)
+        elif self.stream_list:
+            response = streaming_success_response(self.iter_serialized_chunks(queryset))
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = success_response(data=serializer.data)
+        return self.set_validator_headers(response, etag)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return success_response(data=serializer.data)
+    def iter_serialized_chunks(self, queryset):
+        """
+        Yields the serialized rows of the queryset, as lists of at most `stream_chunk_size` items.
+        """
+        chunk = []
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(instance)
+            if len(chunk) == self.stream_chunk_size:
+                yield self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield self.get_serializer(chunk, many=True).data
 
 
 class CreateModelMixin(DefaultCreateModelMixin):
@@ -122,3 +460,205 @@ class DestroyModelMixin(DefaultDestroyModelMixin):
         return success_response(
             message=_("Deleted successfully"), status_code=status.HTTP_204_NO_CONTENT
         )
+
+
+class BulkMixin:
+    """
+    Helpers of the bulk actions, which identify items by the lookup field of the viewset.
+    """
+
+    bulk_max_items = settings.BULK_MAX_ITEMS
+
+    def get_bulk_lookup_field(self):
+        """
+        :return: The model field items are identified by, i.e. the lookup field, or the primary key for `pk`.
+        """
+        model = self.get_queryset().model
+        if self.lookup_field == "pk":
+            return model._meta.pk
+        return model._meta.get_field(self.lookup_field)
+
+    def validate_bulk_payload(self, payload):
+        """
+        :return: An error response if the payload isn't a non-empty list of at most `bulk_max_items` items.
+        """
+        if not isinstance(payload, list) or not payload:
+            return error_response(error=_("Expected a non-empty list of items."))
+        if len(payload) > self.bulk_max_items:
+            return error_response(
+                error=_("At most %(count)s items can be sent at once.")
+                % {"count": self.bulk_max_items}
+            )
+        return None
+
+    def get_bulk_instances(self, lookups):
+        """
+        Fetches the instances of the given lookup values in one query, from the tenant-scoped queryset of the
+        viewset, checking the object permissions of each.
+
+        :param lookups: The lookup values, in the order of the items.
+
+        :return: A dict of instances by lookup value, the lookup values converted to python, and a list of
+            per-item errors.
+        """
+        field = self.get_bulk_lookup_field()
+        values, errors = [], []
+        for index, lookup in enumerate(lookups):
+            try:
+                values.append(field.to_python(lookup))
+            except ValidationError:
+                values.append(None)
+                errors.append(self.get_item_error(index, lookup, _("Invalid identifier.")))
+
+        queryset = self.filter_queryset(self.get_queryset())
+        instances = queryset.in_bulk(
+            [value for value in values if value is not None], field_name=field.name
+        )
+        for index, (lookup, value) in enumerate(zip(lookups, values)):
+            if value is not None and value not in instances:
+                errors.append(self.get_item_error(index, lookup, _("Not found.")))
+
+        for instance in instances.values():
+            self.check_object_permissions(self.request, instance)
+        return instances, values, errors
+
+    @staticmethod
+    def get_item_error(index, lookup, errors):
+        return {"index": index, "id": lookup, "errors": errors}
+
+
+class BulkUpdateModelMixin(BulkMixin):
+    """
+    Partially update several model instances with `PATCH` on the list route (see `utils.routers.BulkRouter`).
+
+    The request body is a list of partial representations, each with the lookup field of the viewset. Items are
+    validated with the serializer of the viewset, and if any item is invalid, nothing is written and the errors
+    are returned per item. Otherwise, all instances are written with `bulk_update` in batches of
+    `bulk_update_batch_size` rows, in one transaction.
+    """
+
+    bulk_update_batch_size = settings.BULK_UPDATE_BATCH_SIZE
+
+    def bulk_update(self, request, *args, **kwargs):
+        """
+        Bulk update method to partially update several model instances.
+
+        :param request: The request object.
+
+        :return: The updated instances, or the errors of the invalid items.
+        """
+        invalid_payload = self.validate_bulk_payload(request.data)
+        if invalid_payload is not None:
+            return invalid_payload
+
+        lookup_name = self.get_bulk_lookup_field().name
+        errors = [
+            self.get_item_error(index, None, {lookup_name: [_("This field is required.")]})
+            for index, item in enumerate(request.data)
+            if not isinstance(item, dict) or item.get(lookup_name) is None
+        ]
+        if errors:
+            return error_response(error=errors)
+
+        instances, values, errors = self.get_bulk_instances(
+            [item[lookup_name] for item in request.data]
+        )
+        updated, update_fields, item_errors = self.validate_bulk_items(
+            request.data, [instances.get(value) for value in values], lookup_name
+        )
+        errors.extend(item_errors)
+        if errors:
+            return error_response(error=sorted(errors, key=lambda error: error["index"]))
+
+        self.perform_bulk_update(updated, update_fields)
+        serializer = self.get_serializer(updated, many=True)
+        return success_response(data=serializer.data)
+
+    def validate_bulk_items(self, items, instances, lookup_name):
+        """
+        Validates every item with the serializer of the viewset, and sets its validated values on its instance.
+
+        :param items: The partial representations sent.
+        :param instances: The instance of every item, or None if it wasn't found.
+        :param lookup_name: The name of the lookup field.
+
+        :return: The instances to update, the names of the fields to update, and a list of per-item errors.
+        """
+        updated, update_fields, errors = [], set(), []
+        for index, (item, instance) in enumerate(zip(items, instances)):
+            if instance is None:
+                continue
+            serializer = self.get_serializer(instance, data=item, partial=True)
+            if not serializer.is_valid():
+                errors.append(
+                    self.get_item_error(index, item[lookup_name], serializer.errors)
+                )
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(instance, attr, value)
+                update_fields.add(attr)
+            updated.append(instance)
+        return updated, update_fields, errors
+
+    def perform_bulk_update(self, instances, update_fields):
+        model = self.get_queryset().model
+        update_fields = set(update_fields)
+        now = timezone.now()
+        field_names = {field.name for field in model._meta.get_fields()}
+        for instance in instances:
+            # bulk_update skips the `auto_now` of `updated_at`, and the audit fields are ours to fill
+            if "updated_at" in field_names:
+                instance.updated_at = now
+                update_fields.add("updated_at")
+            if "updated_by" in field_names and self.request.user.is_authenticated:
+                instance.updated_by_id = self.request.user.pk
+                update_fields.add("updated_by")
+
+        with transaction.atomic():
+            model._meta.default_manager.bulk_update(
+                instances, sorted(update_fields), batch_size=self.bulk_update_batch_size
+            )
+            # bulk_update doesn't send post_save, which is what invalidates the cached data of the model
+            tenant = getattr(self.request.user, "organisation_id", None)
+            transaction.on_commit(lambda: bump_model_generation(model, tenant))
+
+
+class BulkDestroyModelMixin(BulkMixin):
+    """
+    Soft delete several model instances with `DELETE` on the list route (see `utils.routers.BulkRouter`), in a
+    single UPDATE, as the admin does.
+
+    The request body is a list of lookup values. If any of them isn't found in the queryset of the viewset,
+    nothing is deleted and the errors are returned per item.
+    """
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        """
+        Bulk destroy method to soft delete several model instances.
+
+        :param request: The request object.
+
+        :return: A success response, or the errors of the items which can't be deleted.
+        """
+        invalid_payload = self.validate_bulk_payload(request.data)
+        if invalid_payload is not None:
+            return invalid_payload
+
+        instances, _values, errors = self.get_bulk_instances(request.data)
+        if errors:
+            return error_response(error=sorted(errors, key=lambda error: error["index"]))
+
+        self.perform_bulk_destroy(instances.values())
+        return success_response(
+            message=_("Deleted successfully"), status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    def perform_bulk_destroy(self, instances):
+        model = self.get_queryset().model
+        # Rows deleted already keep their deletion date
+        soft_delete(
+            model._meta.default_manager.filter(
+                pk__in=[instance.pk for instance in instances], deleted_at=None
+            ),
+            self.request.user,
+        )
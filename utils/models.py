@@ -2,10 +2,13 @@ import random
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from utils.cache import bump_model_generation
+from utils.managers import CachedManager
+
 
 def slug_generator() -> str:
     """
@@ -20,6 +23,37 @@ def slug_generator() -> str:
     )  # NOSONAR
 
 
+def soft_delete(queryset, user) -> int:
+    """
+    Marks the rows of a queryset as deleted in a single UPDATE: sets `deleted_at` and `updated_at`, and
+    `deleted_by`, `updated_by` and `is_active` when the model has them.
+
+    Args:
+        queryset: The rows to delete.
+        user: The user deleting them.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    now = timezone.now()
+    update_fields = {"deleted_at": now, "updated_at": now}
+
+    field_names = {field.name for field in queryset.model._meta.get_fields()}
+    if "is_active" in field_names:
+        update_fields["is_active"] = False
+    if "deleted_by" in field_names:
+        update_fields["deleted_by"] = user
+    if "updated_by" in field_names:
+        update_fields["updated_by"] = user
+
+    count = queryset.update(**update_fields)
+    # QuerySet.update doesn't send post_save, which is what invalidates the cached data of the model. Bumped once
+    # committed, or a read in between would cache the rows as they were under the new generation.
+    model = queryset.model
+    transaction.on_commit(lambda: bump_model_generation(model))
+    return count
+
+
 class AutoUpdateMixin:
     """
     By default, Django doesn't update `auto_now` field if `update_fields` is used while saving an object.
@@ -51,6 +85,11 @@ class TimeStampedModel(AutoUpdateMixin, models.Model):
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
     deleted_at = models.DateTimeField(_("deleted at"), blank=True, null=True)
 
+    # `objects` is declared first to stay the default manager
+    objects = models.Manager()
+    # Same as `objects`, with the results cached until the table is written (see `utils.managers`)
+    cached = CachedManager()
+
     class Meta:
         abstract = True
 
@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+@dataclass
+class QuerysetPlan:
+    """
+    What a serializer reads from a queryset: the relations to join or to prefetch, and the columns.
+
+    Attributes:
+        select_related (set): Forward relations to join, as lookup paths.
+        prefetch_related (dict): Many-valued relations to prefetch, by lookup path, with the plan of their rows.
+        only (set): Columns to load, as lookup paths; None if they can't be known, in which case all are loaded.
+    """
+
+    select_related: set = field(default_factory=set)
+    prefetch_related: dict = field(default_factory=dict)
+    only: set = field(default_factory=set)
+
+
+def get_queryset_plan(serializer, model, prefix="") -> QuerysetPlan:
+    """
+    Walks the readable fields of a serializer, and of its nested serializers, to find what they read from `model`.
+
+    - Nested serializers and related fields of forward relations are joined, many-valued ones are prefetched.
+    - Primary key related fields only read the foreign key column.
+    - Fields reading anything else than model fields (`source="*"`, method fields, properties) can read any
+      column, so no `only` is planned for their model.
+    """
+    plan = QuerysetPlan()
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    _add_column(plan, prefix, model._meta.pk.name)
+
+    for serializer_field in serializer.fields.values():
+        if serializer_field.write_only:
+            continue
+        if serializer_field.source == "*":
+            plan.only = None
+            continue
+        _plan_source(plan, serializer_field, model, prefix)
+
+    return plan
+
+
+def _plan_source(plan, serializer_field, model, path):
+    source_attrs = serializer_field.source.split(".")
+    for position, attr in enumerate(source_attrs):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # A property or a method, which can read anything
+            plan.only = None
+            return
+
+        lookup = f"{path}{attr}"
+        # The serializer field reads the last attribute of its source, the others are only walked through
+        read_by = serializer_field if position == len(source_attrs) - 1 else None
+        if not model_field.is_relation:
+            _add_column(plan, path, attr)
+            return
+
+        if model_field.many_to_many or model_field.one_to_many:
+            _plan_prefetch_related(plan, lookup, model_field, read_by)
+            return
+
+        if not model_field.concrete:
+            # The reverse side of a one-to-one relation, which can't be restricted by `only`
+            plan.select_related.add(lookup)
+            plan.only = None
+            return
+
+        if read_by is not None and _reads_primary_key_only(read_by):
+            _add_column(plan, path, model_field.attname)
+            return
+
+        _add_column(plan, path, attr)
+        _plan_select_related(plan, lookup, model_field, read_by)
+        model, path = model_field.related_model, f"{lookup}__"
+
+
+def _plan_prefetch_related(plan, lookup, model_field, read_by):
+    # Many-valued relations are fetched with one query per relation, for the whole page
+    related_plan = None
+    if isinstance(read_by, serializers.BaseSerializer):
+        related_plan = get_queryset_plan(read_by, model_field.related_model)
+        if model_field.one_to_many:
+            # Prefetched rows are matched to their parent through their foreign key
+            _add_column(related_plan, "", model_field.field.attname)
+    plan.prefetch_related[lookup] = related_plan
+
+
+def _plan_select_related(plan, lookup, model_field, read_by):
+    plan.select_related.add(lookup)
+    if isinstance(read_by, serializers.BaseSerializer):
+        nested_plan = get_queryset_plan(read_by, model_field.related_model, f"{lookup}__")
+        _merge(plan, nested_plan)
+    elif read_by is not None:
+        # A related field reading e.g. a slug or the string of the related object
+        plan.only = None
+
+
+def plan_queryset(queryset, serializer, required_fields=()):
+    """
+    Applies the `select_related`, `prefetch_related` and `only` a serializer needs to a queryset, so that
+    serializing its rows doesn't query each of their relations.
+
+    Args:
+        queryset: The queryset to serialize.
+        serializer: The serializer, or the list serializer, of its rows.
+        required_fields (iterable): Other columns read from the rows, e.g. by the ordering or the pagination. The
+            ones the model doesn't have are ignored.
+
+    Returns:
+        QuerySet: The planned queryset.
+    """
+    plan = get_queryset_plan(serializer, queryset.model)
+    return _apply(queryset, plan, required_fields)
+
+
+def _apply(queryset, plan, required_fields=()):
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    for lookup, related_plan in sorted(plan.prefetch_related.items()):
+        if related_plan is None:
+            queryset = queryset.prefetch_related(lookup)
+        else:
+            related_model = _get_related_model(queryset.model, lookup)
+            related_queryset = _apply(related_model._meta.default_manager.all(), related_plan)
+            queryset = queryset.prefetch_related(
+                Prefetch(lookup, queryset=related_queryset)
+            )
+    if plan.only is not None:
+        columns = set(plan.only)
+        columns.update(_get_ordering_columns(queryset))
+        columns.update(
+            name for name in required_fields if _has_field(queryset.model, name)
+        )
+        queryset = queryset.only(*sorted(columns))
+    return queryset
+
+
+def _reads_primary_key_only(serializer_field):
+    if isinstance(serializer_field, serializers.ManyRelatedField):
+        serializer_field = serializer_field.child_relation
+    return isinstance(serializer_field, serializers.PrimaryKeyRelatedField)
+
+
+def _add_column(plan, path, name):
+    if plan.only is not None:
+        plan.only.add(f"{path}{name}")
+
+
+def _merge(plan, other):
+    plan.select_related |= other.select_related
+    plan.prefetch_related.update(other.prefetch_related)
+    if plan.only is None or other.only is None:
+        plan.only = None
+    else:
+        plan.only |= other.only
+
+
+def _get_ordering_columns(queryset):
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    names = (str(name).lstrip("-") for name in ordering if isinstance(name, str))
+    return {name for name in names if name != "?" and _has_field(queryset.model, name)}
+
+
+def _get_related_model(model, lookup):
+    for attr in lookup.split("__"):
+        model = model._meta.get_field(attr).related_model
+    return model
+
+
+def _has_field(model, name):
+    if name == "pk":
+        return True
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import connections
+
+from utils import logger
+
+# Seconds to wait before reconnecting a subscriber which lost its connection
+RECONNECT_DELAY = 1
+
+
+@lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """
+    Return a process wide Redis client for ``settings.REDIS_URL``.
+
+    The client owns a connection pool, so it is safe to share between threads. redis-py resets the pool
+    when it detects it is being used from a forked process, which keeps it usable across gunicorn workers.
+
+    Returns:
+        redis.Redis: The shared Redis client.
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def publish(channel, message):
+    """
+    Publish a message on a Redis pub/sub channel, errors are logged and swallowed.
+    """
+    try:
+        get_redis_client().publish(channel, message)
+    except redis.RedisError as e:
+        logger.error("Could not publish on channel %s: %s", channel, e)
+
+
+class RedisSubscriber:
+    """
+    Listens to a Redis pub/sub channel from a daemon thread of the current process.
+
+    The thread is started lazily by `ensure_started`, and started again in forked processes (threads don't
+    survive a fork, so a gunicorn worker gets its own). It reconnects when the connection is lost.
+
+    Attributes:
+        channel (str): The channel to subscribe to.
+        on_message (callable): Called with the data of every message.
+        on_connect (callable): Called once subscribed, and then every `refresh_interval` seconds if set. Use it to
+            (re)load the state the messages are applied to, so that nothing published while disconnected is missed.
+        connected (bool): Whether the thread is currently subscribed.
+    """
+
+    def __init__(self, channel, on_message, on_connect=None, refresh_interval=None):
+        self.channel = channel
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.refresh_interval = refresh_interval
+        self.connected = False
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.connected = False
+            threading.Thread(
+                target=self._run, name=f"subscriber-{self.channel}", daemon=True
+            ).start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Subscriber of channel %s failed: %s", self.channel, e)
+            finally:
+                self.connected = False
+                # Django opens a connection per thread, don't keep this one around
+                connections.close_all()
+            time.sleep(RECONNECT_DELAY)
+
+    def _listen(self):
+        pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            refreshed_at = self._refresh()
+            self.connected = True
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message:
+                    self.on_message(message["data"])
+                if (
+                    self.refresh_interval
+                    and time.monotonic() - refreshed_at > self.refresh_interval
+                ):
+                    refreshed_at = self._refresh()
+        finally:
+            pubsub.close()
+
+    def _refresh(self):
+        if self.on_connect:
+            self.on_connect()
+            connections.close_all()
+        return time.monotonic()
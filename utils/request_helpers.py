@@ -29,6 +29,28 @@ def get_ip_address(request):
     return ip_address
 
 
+def get_client_ip_address(request, num_proxies=0):
+    """
+    Function to retrieve the IP address of the client of a request, which the client can't spoof.
+
+    Every proxy in front of the service appends the address it received the request from to 'HTTP_X_FORWARDED_FOR',
+    so only the last `num_proxies` entries can be trusted, the first of them being the client. Without proxies,
+    'REMOTE_ADDR' is used and the header is ignored.
+
+    Parameters:
+    request (HttpRequest): An HttpRequest object
+    num_proxies (int): Number of trusted proxies in front of the service
+
+    Returns:
+    str: The IP address as a string.
+    """
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if num_proxies and x_forwarded_for:
+        addresses = [address.strip() for address in x_forwarded_for.split(",")]
+        return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR")
+
+
 def get_user_agent(request):
     """
     Function to retrieve the User Agent string from a request.
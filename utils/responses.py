@@ -1,55 +1,92 @@
-from django.http import JsonResponse
+from functools import lru_cache
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status as http_status
 
+from backend_service.renderers import dumps
+
+STATUS_MESSAGES = {
+    201: "Created",
+    204: "No Content",
+    400: "Bad Request",
+    401: "Unauthorized",
+    402: "Payment Required",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+ERROR_MESSAGES = {
+    400: "VALIDATION_ERROR",
+    401: "AUTH_FAILED",
+    402: "PAYMENT_REQUIRED",
+    403: "FORBIDDEN",
+    404: "NOT_FOUND",
+    405: "METHOD_NOT_ALLOWED",
+    429: "RATE_LIMIT_EXCEEDED",
+    500: "INTERNAL_SERVER_ERROR",
+    503: "SERVICE_UNAVAILABLE",
+}
+
+MESSAGES = {
+    201: _("Created Successfully"),
+    204: _("Deleted Successfully"),
+    400: _("Bad Request"),
+    401: _("Unauthorized Access"),
+    402: _("Credits are not available"),
+    403: _("Access Restricted"),
+    404: _("Not Found"),
+    405: _("Invalid Request Method"),
+    429: _("Too Many Requests, Please Try Again Later"),
+    500: _("Internal Server Error, Please Try Again Later"),
+    503: _("Service Unavailable, Please Try Again Later"),
+}
+
 
 def get_status_message(status_code):
-    status_messages = {
-        201: "Created",
-        204: "No Content",
-        400: "Bad Request",
-        401: "Unauthorized",
-        402: "Payment Required",
-        403: "Forbidden",
-        404: "Not Found",
-        405: "Method Not Allowed",
-        429: "Too Many Requests",
-        500: "Internal Server Error",
-        503: "Service Unavailable",
-    }
-    return status_messages.get(status_code, "Ok")
+    return STATUS_MESSAGES.get(status_code, "Ok")
 
 
 def get_error_message(status_code):
-    error_messages = {
-        400: "VALIDATION_ERROR",
-        401: "AUTH_FAILED",
-        402: "PAYMENT_REQUIRED",
-        403: "FORBIDDEN",
-        404: "NOT_FOUND",
-        405: "METHOD_NOT_ALLOWED",
-        429: "RATE_LIMIT_EXCEEDED",
-        500: "INTERNAL_SERVER_ERROR",
-        503: "SERVICE_UNAVAILABLE",
-    }
-    return error_messages.get(status_code, "INTERNAL_SERVER_ERROR")
+    return ERROR_MESSAGES.get(status_code, "INTERNAL_SERVER_ERROR")
 
 
 def get_message(status_code):
-    messages = {
-        201: _("Created Successfully"),
-        204: _("Deleted Successfully"),
-        400: _("Bad Request"),
-        401: _("Unauthorized Access"),
-        402: _("Credits are not available"),
-        403: _("Access Restricted"),
-        404: _("Not Found"),
-        405: _("Invalid Request Method"),
-        429: _("Too Many Requests, Please Try Again Later"),
-        500: _("Internal Server Error, Please Try Again Later"),
-        503: _("Service Unavailable, Please Try Again Later"),
+    return MESSAGES.get(status_code, _("Success"))
+
+
+@lru_cache(maxsize=None)
+def get_envelope_prefix(success: bool, status_code: int) -> bytes:
+    """
+    Returns the serialized leading keys of the envelope, which only depend on the status code; the message is
+    translated, so it can't be part of it. E.g. `{"success":true,"code":200,"status":"Ok",`
+    """
+    envelope = {
+        "success": success,
+        "code": status_code,
+        "status": get_status_message(status_code),
     }
-    return messages.get(status_code, _("Success"))
+    if not success:
+        envelope["error"] = get_error_message(status_code)
+    return dumps(envelope)[:-1] + b","
+
+
+class JSONResponse(HttpResponse):
+    """
+    A JSON response of an envelope: the precomputed prefix of its status code, followed by the `message` and
+    `data` keys serialized with orjson.
+    """
+
+    def __init__(self, success, message, data, status_code, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        content = get_envelope_prefix(success, status_code) + dumps(
+            {"message": message, "data": data}
+        )[1:]
+        super().__init__(content=content, status=status_code, **kwargs)
 
 
 def success_response(
@@ -58,15 +95,8 @@ def success_response(
     data: dict = None,
     status_code: int = http_status.HTTP_200_OK,
 ):
-    response = JsonResponse(
-        data={
-            "success": True,
-            "code": status_code,
-            "status": get_status_message(status_code),
-            "message": message,
-            "data": data,
-        },
-        status=status_code,
+    response = JSONResponse(
+        success=True, message=message, data=data, status_code=status_code
     )
     if headers:
         response.headers.update(headers)
@@ -80,16 +110,51 @@ def error_response(
     message: str = None,
     status_code: int = http_status.HTTP_400_BAD_REQUEST,
 ):
-    response = JsonResponse(
-        data={
-            "success": False,
-            "code": status_code,
-            "status": get_status_message(status_code),
-            "error": get_error_message(status_code),
-            "message": message or get_message(status_code),
-            "data": {"error": error},
-        },
-        status=status_code,
+    response = JSONResponse(
+        success=False,
+        message=message or get_message(status_code),
+        data={"error": error},
+        status_code=status_code,
+    )
+    if headers:
+        response.headers.update(headers)
+
+    return response
+
+
+def streaming_success_response(
+    chunks,
+    headers: dict = None,
+    message: str = _("Success"),
+    status_code: int = http_status.HTTP_200_OK,
+):
+    """
+    Same envelope as `success_response`, with `data` a list written incrementally from an iterable of chunks, each
+    a list of items. Only one chunk is held in memory at a time.
+
+    The status is sent before the first chunk is produced, so an error while streaming can only cut the response
+    short; it is logged by Django and the client gets invalid JSON.
+    """
+    # Rendered upfront, while the language of the request is active
+    head = (
+        get_envelope_prefix(True, status_code)
+        + dumps({"message": message})[1:-1]
+        + b',"data":['
+    )
+
+    def stream():
+        yield head
+        separator = b""
+        for chunk in chunks:
+            items = dumps(chunk)[1:-1]
+            if items:
+                yield separator + items
+                separator = b","
+        yield b"]}"
+
+    # JsonResponse serializes the whole body at once, which is what streaming avoids
+    response = StreamingHttpResponse(  # pylint: disable=http-response-with-content-type-json
+        stream(), status=status_code, content_type="application/json"
     )
     if headers:
         response.headers.update(headers)
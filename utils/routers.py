@@ -0,0 +1,18 @@
+from rest_framework.routers import SimpleRouter
+
+
+class BulkRouter(SimpleRouter):
+    """
+    Router which also maps `PATCH` and `DELETE` of the list route, to the `bulk_update` and `bulk_destroy`
+    actions of `utils.mixins.BulkUpdateModelMixin` and `utils.mixins.BulkDestroyModelMixin`. Viewsets without
+    these actions are routed as by `SimpleRouter`.
+    """
+
+    routes = [
+        route._replace(
+            mapping={**route.mapping, "patch": "bulk_update", "delete": "bulk_destroy"}
+        )
+        if route.name == "{basename}-list"
+        else route
+        for route in SimpleRouter.routes
+    ]
@@ -2,11 +2,19 @@ import csv
 import io
 from typing import List
 
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
 from django.db.models import QuerySet
+from rest_framework import serializers
 
+from utils.cache import bump_model_generation
 from utils.file import CSVFileCompressionMixin
 from utils.tasks import send_csv_email
 
+# Audit fields of `utils.models.CustomModel` filled with the requesting user on bulk creation
+AUDIT_USER_FIELDS = ("created_by", "updated_by")
+
 
 class CSVTooLarge(Exception):
     """
@@ -225,3 +233,72 @@ class CSVFileOrEmailModelMixin(CSVFileCompressionMixin):
             A string representing the filename for the generated CSV file.
         """
         return self.csv_file_name or self.get_csv_model()._meta.verbose_name_plural
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    List serializer creating all the items with `bulk_create`, in batches of `batch_size` rows inside a single
+    transaction, instead of one `INSERT` and one transaction per item.
+
+    Every item is validated before anything is written. The audit fields of `utils.models.CustomModel` which the
+    items don't set are filled with the requesting user. The created instances are returned as they are, with the
+    primary keys set by the database, so serializing them doesn't query them again.
+
+    Items with many-to-many values are created one by one, as `bulk_create` can't set them. Set it as the
+    `list_serializer_class` of the `Meta` of a `ModelSerializer`.
+
+    Attributes:
+        batch_size (int): Maximum number of rows per `INSERT`.
+    """
+
+    batch_size = settings.BULK_CREATE_BATCH_SIZE
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        many_to_many = {
+            field.name for field in model._meta.get_fields() if field.many_to_many
+        }
+        if any(many_to_many.intersection(attrs) for attrs in validated_data):
+            return super().create(validated_data)
+
+        audit_fields = self.get_audit_fields(model)
+        user = self.get_audit_user()
+        instances = []
+        for attrs in validated_data:
+            instance = model(**attrs)
+            if user is not None:
+                for field in audit_fields:
+                    if getattr(instance, field.attname) is None:
+                        setattr(instance, field.attname, user.pk)
+            instances.append(instance)
+
+        with transaction.atomic():
+            created = model._meta.default_manager.bulk_create(
+                instances, batch_size=self.batch_size
+            )
+            # bulk_create doesn't send post_save, which is what invalidates the cached data of the model
+            transaction.on_commit(lambda: bump_model_generation(model))
+        return created
+
+    def update(self, instance, validated_data):
+        """
+        Lists are only created in bulk, see `utils.mixins.BulkUpdateModelMixin` to update them.
+        """
+        raise serializers.ValidationError({"error": "Lists of items can only be created"})
+
+    @staticmethod
+    def get_audit_fields(model):
+        fields = []
+        for name in AUDIT_USER_FIELDS:
+            try:
+                fields.append(model._meta.get_field(name))
+            except FieldDoesNotExist:
+                pass
+        return fields
+
+    def get_audit_user(self):
+        request = self.context.get("request")
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user
@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from backend_service.revocations import revocation_index
+from utils.cache import bump_model_generation
+from utils.models import TimeStampedModel
+from utils.users import get_user_id, invalidate_cached_user
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Drop the cached copy of a user whenever it is saved or deleted, and the cached querysets of users, once the
+    write is committed: a lookup in between would cache the user as it was under the new generation.
+    """
+    user_id = get_user_id(instance)
+    if user_id is not None:
+        transaction.on_commit(lambda: invalidate_cached_user(user_id))
+    transaction.on_commit(lambda: bump_model_generation(sender))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def broadcast_token_revocation(sender, instance, created, **kwargs):
+    """
+    Tell every worker about a newly blacklisted token, once it is committed.
+    """
+    if created:
+        jti = instance.token.jti
+        transaction.on_commit(lambda: revocation_index.revoke(jti))
+
+
+@receiver([post_save, post_delete])
+def bump_generation_on_write(sender, instance, **kwargs):
+    """
+    Invalidate what is cached from the table of a `TimeStampedModel` whenever one of its rows is written, once
+    the write is committed, for the organisation of the row if it has one. `QuerySet.update` and `bulk_create`
+    don't send signals, bump the generation yourself.
+    """
+    if issubclass(sender, TimeStampedModel):
+        tenant = getattr(instance, "organisation_id", None)
+        transaction.on_commit(lambda: bump_model_generation(sender, tenant))
@@ -0,0 +1,226 @@
+import fcntl
+import json
+import mmap
+import os
+import stat
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from redis.exceptions import RedisError
+
+from utils import logger
+from utils.cache import MODEL_GENERATION_KEY
+
+# Magic, version, build timestamp and length of the index, followed by the index and the values, as JSON
+HEADER = struct.Struct("<4sQdQ")
+MAGIC = b"SNP2"
+
+
+def ensure_private_directory(path):
+    """
+    Creates a directory only the current user can access, or checks that an existing one is.
+
+    Raises:
+        PermissionError: If the directory belongs to another user or is accessible to other users.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) & 0o077
+    ):
+        raise PermissionError(
+            f"{path} must be a directory owned by the current user and only accessible to it"
+        )
+
+
+class Snapshot:
+    """
+    A snapshot file mapped in memory. The pages are shared by every process mapping the file, values are only
+    decoded when they are looked up.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.inode = os.fstat(file.fileno()).st_ino
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.built_at, index_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} isn't a snapshot")
+        index = json.loads(self._mmap[HEADER.size : HEADER.size + index_length])
+        self.generations = tuple(index["generations"])
+        self._offsets = index["offsets"]
+        self._start = HEADER.size + index_length
+
+    def get(self, key, default=None):
+        location = self._offsets.get(key)
+        if location is None:
+            return default
+        offset, length = location
+        start = self._start + offset
+        return json.loads(self._mmap[start : start + length])
+
+    def keys(self):
+        return self._offsets.keys()
+
+    @staticmethod
+    def write(path, version, generations, data):
+        """
+        Writes a snapshot next to `path` and swaps it in atomically, readers see either the old or the new file.
+        The file is only readable by the current user.
+        """
+        offsets = {}
+        values = []
+        position = 0
+        for key, value in data.items():
+            payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            offsets[key] = (position, len(payload))
+            values.append(payload)
+            position += len(payload)
+        index = json.dumps(
+            {"generations": list(generations), "offsets": offsets}, separators=(",", ":")
+        ).encode("utf-8")
+
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(descriptor, "wb") as file:
+            file.write(HEADER.pack(MAGIC, version, time.time(), len(index)))
+            file.write(index)
+            for payload in values:
+                file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+
+class SnapshotStore:
+    """
+    Read-mostly data shared by the workers of a host through a memory-mapped file, instead of a copy per worker
+    refreshed from the database or Redis by each of them.
+
+    - `build` returns the data as a dict of JSON values by string keys, looked up with `get`. It is called by a
+      single process of the host at a time (under an `flock`), which writes a new versioned snapshot file and
+      swaps it in with an atomic rename. Don't put secrets in it, and serialize instances to plain values.
+    - Files are kept in `settings.SNAPSHOT_DIR`, which must be owned by the user of the workers and only
+      accessible to it; snapshots are unavailable otherwise.
+    - Workers map the file, and check at most every `settings.SNAPSHOT_CHECK_INTERVAL` seconds whether it was
+      swapped (its inode changed) or is stale: older than `max_age` seconds, or built before a write of one of
+      `models` (their generations changed, see `utils.cache`). A stale snapshot keeps being served while one
+      process rebuilds it; only the very first build is waited for.
+    - Lookups don't do any I/O and only decode the value looked up, so callers get their own copy.
+
+    Attributes:
+        name (str): Name of the snapshot file, in `settings.SNAPSHOT_DIR`.
+        build (callable): Returns the data.
+        models (list): Models the data is read from.
+        max_age (int): Number of seconds after which the snapshot is rebuilt, defaults to
+            `settings.SNAPSHOT_MAX_AGE`.
+    """
+
+    def __init__(self, name, build, models=(), max_age=None):
+        self.name = name
+        self.build = build
+        self.models = models
+        self.max_age = max_age
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(settings.SNAPSHOT_DIR, f"{self.name}.snapshot")
+
+    def get(self, key, default=None):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return default
+        return snapshot.get(key, default)
+
+    def get_snapshot(self):
+        """
+        Returns the current snapshot, building it if there is none yet, or None if it can't be built.
+        """
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < settings.SNAPSHOT_CHECK_INTERVAL:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is None or now - self._checked_at >= settings.SNAPSHOT_CHECK_INTERVAL:
+                self._checked_at = now
+                try:
+                    self._snapshot = self._check()
+                except (OSError, ValueError, DatabaseError) as e:
+                    logger.error("Snapshot %s is unavailable: %s", self.name, e)
+        return self._snapshot
+
+    def refresh(self, blocking=True):
+        """
+        Rebuilds the snapshot, unless another process is doing it already and `blocking` is False.
+        """
+        ensure_private_directory(settings.SNAPSHOT_DIR)
+        descriptor = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        with open(descriptor, "rb") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return
+            try:
+                current = self._load()
+                generations = self._get_generations()
+                # Another process may have rebuilt it while we waited for the lock
+                if current is not None and not self._is_stale(current, generations):
+                    return
+                version = current.version + 1 if current is not None else 1
+                Snapshot.write(self.path, version, generations or (), self.build())
+                logger.info("Snapshot %s rebuilt, version %s", self.name, version)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _check(self):
+        ensure_private_directory(settings.SNAPSHOT_DIR)
+        snapshot = self._snapshot
+        if snapshot is None or self._is_swapped(snapshot):
+            snapshot = self._load()
+        if snapshot is None:
+            self.refresh()
+            return self._load()
+
+        if self._is_stale(snapshot, self._get_generations()):
+            self.refresh(blocking=False)
+            if self._is_swapped(snapshot):
+                snapshot = self._load() or snapshot
+        return snapshot
+
+    def _load(self):
+        try:
+            return Snapshot(self.path)
+        except FileNotFoundError:
+            return None
+
+    def _is_swapped(self, snapshot):
+        try:
+            return os.stat(self.path).st_ino != snapshot.inode
+        except FileNotFoundError:
+            return False
+
+    def _is_stale(self, snapshot, generations):
+        max_age = settings.SNAPSHOT_MAX_AGE if self.max_age is None else self.max_age
+        if time.time() - snapshot.built_at > max_age:
+            return True
+        return generations is not None and generations != snapshot.generations
+
+    def _get_generations(self):
+        if not self.models:
+            return ()
+        keys = [MODEL_GENERATION_KEY.format(model._meta.label_lower) for model in self.models]
+        try:
+            values = cache.get_many(keys)
+        except RedisError as e:
+            logger.error("Snapshot %s can only expire as Redis is unavailable: %s", self.name, e)
+            return None
+        return tuple(values.get(key, 0) for key in keys)
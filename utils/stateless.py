@@ -4,8 +4,18 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 from rest_framework_simplejwt.models import TokenUser
 
+from utils.http import CachedJSONClient, CircuitOpenError
+
 User = get_user_model()
 
+# Shared by the authentication backend and the token users, so that the user and permission payloads of the
+# authentication app are fetched over pooled connections, at most once per AUTHENTICATION_APP_CACHE_TIMEOUT
+authentication_app_client = CachedJSONClient(
+    timeout=settings.AUTHENTICATION_APP_CACHE_TIMEOUT,
+    stale_timeout=settings.AUTHENTICATION_APP_STALE_TIMEOUT,
+    request_timeout=settings.AUTHENTICATION_APP_REQUEST_TIMEOUT,
+)
+
 
 class CustomAuthenticationBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -32,15 +42,13 @@ class CustomAuthenticationBackend(ModelBackend):
             and hasattr(settings, "AUTHENTICATION_ENDPOINT")
             and settings.API_BASED_AUTHENTICATION
         ):
-            response = requests.get(
-                url=f"{settings.AUTHENTICATION_APP_URL}{settings.AUTHENTICATION_ENDPOINT}",
-                timeout=5,
-            )
-            if response.status_code == 200:
-                user_data = response.json()
-                return self.get_user_by_data(user_data)
-            else:
+            try:
+                user_data = authentication_app_client.get(
+                    f"{settings.AUTHENTICATION_APP_URL}{settings.AUTHENTICATION_ENDPOINT}"
+                )
+            except (requests.RequestException, CircuitOpenError):
                 return None
+            return self.get_user_by_data(user_data)
 
         # Use the default authentication method
         return super().authenticate(request, username, password, **kwargs)
@@ -50,7 +58,8 @@ class CustomAuthenticationBackend(ModelBackend):
             user = User.objects.get(pk=user_data["id"])
             updated_keys = []
             for key, value in user_data.items():
-                if hasattr(user, key):
+                # Only write the columns which actually changed
+                if hasattr(user, key) and getattr(user, key) != value:
                     updated_keys.append(key)
                     setattr(user, key, value)
             if updated_keys:
@@ -78,11 +87,9 @@ class CustomTokenUser(TokenUser):
             and hasattr(settings, "PERMISSIONS_ENDPOINT")
             and settings.API_BASED_AUTHENTICATION
         ):
-            response = requests.get(
-                url=f"{settings.AUTHENTICATION_APP_URL}{settings.PERMISSIONS_ENDPOINT}",
-                timeout=5,
+            return authentication_app_client.get(
+                f"{settings.AUTHENTICATION_APP_URL}{settings.PERMISSIONS_ENDPOINT}"
             )
-            return response.json()
         if hasattr(settings, "CUSTOM_CLAIM") and hasattr(settings, "PERMISSIONS_CLAIM"):
             return self.token.get(settings.CUSTOM_CLAIM, {}).get(
                 settings.PERMISSIONS_CLAIM, {}
@@ -1,14 +1,134 @@
 import base64
+import binascii
 import gzip
 import json
+import zlib
+
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+# Separates the codec version from the payload of an encoded custom claim. It can't appear in the base64 output
+# of the legacy gzip codec, which has no version prefix.
+VERSION_SEPARATOR = ":"
+
+# Preset dictionary for the "2" codec, made of the keys and values commonly found in role and permission claims.
+# Deflate can reference it from the first byte, which is what makes small claims compress well.
+# Never change it: tokens encoded with it can only be decoded with the exact same bytes. Add a new codec instead.
+CLAIM_DICTIONARY_V2 = (
+    b'"uuid":"","id":"","code":"","slug":"","type":"","scope":"","level":'
+    b'"is_active":true,"is_admin":false,"is_staff":false,"is_superuser":false,'
+    b'"business_unit":"","organisation_id":"","organisation":"","tenant":"",'
+    b'"view","add","change","delete","create","read","update","list","manage",'
+    b'"groups":[],"modules":[],"features":[],"permissions":[],'
+    b'"role":{"name":"admin","name":"user","name":"'
+)
+
+
+def _b64encode(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(payload: str) -> bytes:
+    return base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+
+
+def _compact_json(custom_claim) -> bytes:
+    return json.dumps(custom_claim, separators=(",", ":")).encode("utf-8")
+
+
+class GzipClaimCodec:
+    """
+    The original codec: gzip compressed JSON, base64 encoded, without a version prefix.
+    """
+
+    version = "gzip"
+
+    @staticmethod
+    def encode(custom_claim) -> str:
+        compressed_payload = gzip.compress(json.dumps(custom_claim).encode("utf-8"))
+        return base64.b64encode(compressed_payload).decode("utf-8")
+
+    @staticmethod
+    def decode(payload: str):
+        decompressed_payload = gzip.decompress(base64.b64decode(payload))
+        return json.loads(decompressed_payload.decode("utf-8"))
+
+
+class DeflateClaimCodec:
+    """
+    Compact JSON compressed with raw deflate, i.e. without the 18 bytes of gzip header and trailer, and encoded
+    with unpadded URL safe base64. Subclasses can set a preset dictionary.
+    """
+
+    version = "1"
+    dictionary = None
+
+    def encode(self, custom_claim) -> str:
+        compressor = self._compressobj()
+        payload = compressor.compress(_compact_json(custom_claim)) + compressor.flush()
+        return f"{self.version}{VERSION_SEPARATOR}{_b64encode(payload)}"
+
+    def decode(self, payload: str):
+        decompressor = (
+            zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.dictionary)
+            if self.dictionary
+            else zlib.decompressobj(-zlib.MAX_WBITS)
+        )
+        decompressed_payload = decompressor.decompress(_b64decode(payload))
+        decompressed_payload += decompressor.flush()
+        return json.loads(decompressed_payload)
+
+    def _compressobj(self):
+        if self.dictionary:
+            return zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.dictionary)
+        return zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+
+class DictionaryDeflateClaimCodec(DeflateClaimCodec):
+    """
+    `DeflateClaimCodec` with a preset dictionary trained on the shape of our role and permission claims.
+    """
+
+    version = "2"
+    dictionary = CLAIM_DICTIONARY_V2
+
+
+CLAIM_CODECS = {
+    codec.version: codec
+    for codec in (GzipClaimCodec(), DeflateClaimCodec(), DictionaryDeflateClaimCodec())
+}
+
+
+def encode_claim(custom_claim, version=None) -> str:
+    """
+    Encodes a custom claim with the codec of the given version, `settings.CUSTOM_CLAIM_CODEC` by default.
+    """
+    return CLAIM_CODECS[version or settings.CUSTOM_CLAIM_CODEC].encode(custom_claim)
+
+
+def decode_claim(encoded_claim: str):
+    """
+    Decodes a custom claim encoded by any of the codecs, picking the codec from the version prefix.
+
+    Raises:
+        InvalidToken: If the version is unknown or the payload can't be decoded.
+    """
+    version, separator, payload = encoded_claim.partition(VERSION_SEPARATOR)
+    if not separator:
+        version, payload = GzipClaimCodec.version, encoded_claim
+    codec = CLAIM_CODECS.get(version)
+    if codec is None:
+        raise InvalidToken(f"Unknown custom_claim codec: {version}")
+    try:
+        return codec.decode(payload)
+    except (ValueError, binascii.Error, zlib.error, OSError, EOFError) as exc:
+        raise InvalidToken("custom_claim can't be decoded") from exc
 
 
 def encode_token(token):
     custom_claim = token.get("custom_claim")
     if custom_claim:
-        compressed_payload = gzip.compress(json.dumps(custom_claim).encode("utf-8"))
-        encoded_payload = base64.b64encode(compressed_payload).decode("utf-8")
-        token["custom_claim"] = encoded_payload
+        token["custom_claim"] = encode_claim(custom_claim)
 
     return token
 
@@ -16,8 +136,6 @@ def encode_token(token):
 def decoded_token(token):
     custom_claim = token.get("custom_claim")
     if custom_claim:
-        decoded_compressed_payload = base64.b64decode(custom_claim)
-        decompressed_payload = gzip.decompress(decoded_compressed_payload)
-        token["custom_claim"] = json.loads(decompressed_payload.decode("utf-8"))
+        token["custom_claim"] = decode_claim(custom_claim)
 
     return token
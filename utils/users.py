@@ -1,16 +1,176 @@
+import copy
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.settings import api_settings
+
+from utils import logger
+from utils.cache import MISSING, CachePolicy, LocalCache, get_or_compute
+from utils.managers import CachedQuerySet
 
 User = get_user_model()
 
+# Users are cached by their `USER_ID_FIELD` (see `SIMPLE_JWT`) and their generation, a counter bumped on every
+# write of the user: a lookup which read the user before a write can't cache it under the new generation.
+USER_CACHE_KEY = "auth_user:{}:{}"
+USER_ACTIVE_CACHE_KEY = "auth_user_active:{}:{}"
+USER_GENERATION_KEY = "auth_user_generation:{}"
+
+# First tier of the user cache, in front of Redis. Entries can be stale in other workers for at most
+# USER_CACHE_LOCAL_TIMEOUT seconds after the user changes.
+local_user_cache = LocalCache(
+    maxsize=settings.USER_CACHE_LOCAL_MAX_SIZE,
+    timeout=settings.USER_CACHE_LOCAL_TIMEOUT,
+)
+# Invalidations of every user in the current worker, so that a lookup started before one isn't kept in-process
+local_user_generations = Counter()
+# Lookups served by Redis, and lookups which had to query the database
+user_cache_counters = Counter()
+
 
 def system_user(username=None):
     # A system user to be used by celery tasks or any other change that isn't made by an actual user
     username = username or "background_job_user"
     try:
-        return User.objects.get(username=username)
+        # Looked up by every background job, and almost never written. The password hash isn't cached.
+        return CachedQuerySet(model=User).defer("password").get(username=username)
     except User.DoesNotExist:
         return User.objects.create_user(username=username, is_active=False)
 
 
 def notifications_user():
     return system_user("notifications_user")
+
+
+def get_user_id(user):
+    """
+    Returns the id users are cached by, the `USER_ID_FIELD` of JWT authentication, or None if the user model
+    doesn't have it.
+    """
+    return getattr(user, api_settings.USER_ID_FIELD, None)
+
+
+def get_user_generation(user_id):
+    """
+    Returns the generation of a user, bumped by `invalidate_cached_user`, or None if Redis is unavailable.
+    """
+    try:
+        return cache.get(
+            USER_GENERATION_KEY.format(user_id), 0, version=settings.USER_CACHE_VERSION
+        )
+    except RedisError as e:
+        logger.error("Cached user %s is skipped as Redis is unavailable: %s", user_id, e)
+        return None
+
+
+def get_cached_user(user_id):
+    """
+    Read-through lookup of a user by its `USER_ID_FIELD`: the in-process cache first, then Redis, then the
+    database.
+
+    Redis keys are versioned with `settings.USER_CACHE_VERSION`, so bumping it after a change of the user model
+    discards every cached user at once. Cached users are invalidated once a save or delete is committed (see
+    `utils.signals`). The password hash is deferred, so it is never cached: reading it queries the database.
+
+    Parameters:
+    user_id (str): The id of the user
+
+    Returns:
+    User: A copy of the cached user, which the caller is free to modify
+
+    Raises:
+    User.DoesNotExist: If there is no such user
+    """
+    local_key = ("user", user_id)
+    user = local_user_cache.get(local_key)
+    if user is MISSING:
+        local_generation = local_user_generations[user_id]
+        queried = []
+
+        def get_user():
+            queried.append(True)
+            return User.objects.defer("password").get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+
+        generation = get_user_generation(user_id)
+        if generation is None:
+            return get_user()
+        # One worker queries a user whose cached copy expired, and unknown ids are cached too
+        user = get_or_compute(
+            USER_CACHE_KEY.format(user_id, generation),
+            get_user,
+            settings.USER_CACHE_TIMEOUT,
+            version=settings.USER_CACHE_VERSION,
+            policy=CachePolicy(negative=(User.DoesNotExist,)),
+        )
+        user_cache_counters["database" if queried else "redis"] += 1
+        if local_user_generations[user_id] == local_generation:
+            local_user_cache.set(local_key, user)
+
+    return copy.copy(user)
+
+
+def is_user_active(user_id) -> bool:
+    """
+    Whether a user exists and is active, cached like `get_cached_user` but without loading the user.
+
+    Parameters:
+    user_id (str): The id of the user
+
+    Returns:
+    bool: False if the user was deactivated or deleted
+    """
+    local_key = ("user_active", user_id)
+    is_active = local_user_cache.get(local_key)
+    if is_active is MISSING:
+        local_generation = local_user_generations[user_id]
+
+        def get_is_active():
+            lookup = {api_settings.USER_ID_FIELD: user_id, "is_active": True}
+            return User.objects.filter(**lookup).exists()
+
+        generation = get_user_generation(user_id)
+        if generation is None:
+            return get_is_active()
+        is_active = get_or_compute(
+            USER_ACTIVE_CACHE_KEY.format(user_id, generation),
+            get_is_active,
+            settings.USER_CACHE_TIMEOUT,
+            version=settings.USER_CACHE_VERSION,
+        )
+        if local_user_generations[user_id] == local_generation:
+            local_user_cache.set(local_key, is_active)
+    return is_active
+
+
+def invalidate_cached_user(user_id):
+    """
+    Bumps the generation of a user in Redis, which orphans its cached entries, and drops them from the
+    in-process cache of the current worker.
+    """
+    local_user_generations[user_id] += 1
+    local_user_cache.delete(("user", user_id))
+    local_user_cache.delete(("user_active", user_id))
+    key = USER_GENERATION_KEY.format(user_id)
+    try:
+        cache.add(key, 0, timeout=None, version=settings.USER_CACHE_VERSION)
+        cache.incr(key, version=settings.USER_CACHE_VERSION)
+    except (RedisError, ValueError) as e:
+        logger.error("Cached user %s could not be invalidated: %s", user_id, e)
+
+
+def user_cache_stats() -> dict:
+    """
+    Returns the hit and miss counters of the user cache for the current worker.
+    """
+    stats = local_user_cache.stats()
+    return {
+        "local_hits": stats["hits"],
+        "redis_hits": user_cache_counters["redis"],
+        "misses": user_cache_counters["database"],
+        "local_size": stats["size"],
+    }
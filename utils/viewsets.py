@@ -6,9 +6,34 @@ from backend_service.exceptions import (
     NotAuthorizedAPIException,
 )
 from utils import mixins
+from utils.querysets import plan_queryset
 
 
 class GenericViewSet(DefaultGenericViewSet):
+    # Actions for which JWT authentication builds the user from the token claims only, without querying it,
+    # e.g. ("list", "retrieve"). See `backend_service.authentication.ClaimsUser`.
+    claims_user_actions = ()
+    # Actions whose queryset gets the `select_related`, `prefetch_related` and `only` their serializer needs, see
+    # `utils.querysets.plan_queryset`. Set to () to disable, or override `plan_queryset`.
+    planned_queryset_actions = ("list", "retrieve")
+    # Columns always loaded by planned querysets, on top of what the serializer reads, e.g. by the pagination
+    # ordering or by conditional GETs
+    planned_queryset_fields = ("created_at", "updated_at")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.planned_queryset_actions:
+            queryset = self.plan_queryset(queryset)
+        return queryset
+
+    def plan_queryset(self, queryset):
+        """
+        Applies the `select_related`, `prefetch_related` and `only` the serializer of the viewset needs.
+        """
+        return plan_queryset(
+            queryset, self.get_serializer(), required_fields=self.planned_queryset_fields
+        )
+
     def http_method_not_allowed(self, request, *args, **kwargs):
         """
         If `request.method` does not correspond to a handler method,